@@ -0,0 +1,214 @@
+import hashlib
+import math
+import random
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings as s
+from django.core.cache import cache
+from django.utils.cache import (
+    get_cache_key, has_vary_header, learn_cache_key, patch_cache_control
+)
+from django.views.decorators.http import condition
+
+from core.cache.generations import get_generations, last_bumped
+
+
+def _lock_key(request, prefix):
+    url = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    return f'views.lock.{prefix}.{url}'
+
+
+def _refresh_due(expires, delta, beta):
+    # Вероятностное раннее обновление (XFetch): чем дороже была сборка
+    # страницы и чем ближе срок, тем выше шанс пересобрать её заранее.
+    return time.time() - delta * beta * math.log(1 - random.random()) >= (
+        expires
+    )
+
+
+def _cacheable(request, response):
+    if response.streaming or response.status_code != 200:
+        return False
+    if not request.COOKIES and response.cookies and has_vary_header(
+        response, 'Cookie'
+    ):
+        return False
+    return 'private' not in response.get('Cache-Control', ())
+
+
+def _prefix(key_prefix, generations, request, args, kwargs):
+    # Имя входит в префикс вместе с номером: номера поколений берутся от
+    # времени и у разных страниц могут совпасть. Хеш держит ключ коротким
+    # при длинных именах вроде profile:<username>.
+    names = [
+        name(request, *args, **kwargs) if callable(name) else name
+        for name in generations
+    ]
+    versions = '.'.join(
+        f'{name}={value}'
+        for name, value in zip(names, get_generations(names))
+    )
+    return f'{key_prefix}.{hashlib.md5(versions.encode()).hexdigest()}'
+
+
+def _lookup(request, prefix):
+    key = get_cache_key(request, prefix, 'GET', cache=cache)
+    return None if key is None else cache.get(key)
+
+
+def _rebuild(view, request, args, kwargs, prefix, lock, timeout, stale):
+    try:
+        started = time.time()
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render') and callable(response.render):
+            response.render()
+        if _cacheable(request, response):
+            key = learn_cache_key(
+                request, response, timeout + stale, prefix, cache=cache
+            )
+            cache.set(
+                key,
+                (response, time.time() + timeout, time.time() - started),
+                timeout + stale,
+            )
+        return response
+    finally:
+        cache.delete(lock)
+
+
+def _wait(request, prefix, lock, lock_timeout):
+    deadline = time.time() + lock_timeout
+    while time.time() < deadline:
+        time.sleep(s.CACHE_LOCK_POLL)
+        entry = _lookup(request, prefix)
+        if entry is not None:
+            return entry[0]
+        if not cache.has_key(lock):
+            return None
+    return None
+
+
+def _cached(request, prefix, lock, lock_timeout, beta):
+    # Возвращает (ответ из кэша, взята ли блокировка на пересборку).
+    entry = _lookup(request, prefix)
+    if entry is not None:
+        response, expires, delta = entry
+        if not _refresh_due(expires, delta, beta):
+            return response, False
+        if not cache.add(lock, True, lock_timeout):
+            return response, False
+        return None, True
+    if cache.add(lock, True, lock_timeout):
+        return None, True
+    response = _wait(request, prefix, lock, lock_timeout)
+    if response is not None:
+        return response, False
+    return None, cache.add(lock, True, lock_timeout)
+
+
+def cache_page_guarded(timeout, key_prefix='', generations=(),
+                       stale_timeout=None, lock_timeout=None, beta=None):
+    # Замена cache_page для дорогих страниц.
+    # * В префикс ключа входят номера поколений: имя или функция
+    #   (request, *args, **kwargs) -> имя. Увеличение поколения делает
+    #   прежние ключи недостижимыми, поэтому timeout может быть большим.
+    # * Пересобирает страницу только тот, кто взял блокировку в кэше;
+    #   остальные получают устаревшую копию или ждут готовую.
+    # * Запись живёт timeout + stale_timeout: после timeout её ещё можно
+    #   отдавать, пока идёт пересборка.
+    # Заголовки Expires/max-age не выставляются: срок жизни в браузере
+    # не должен пережить инвалидацию по поколению.
+    if stale_timeout is None:
+        stale_timeout = s.CACHE_STALE_TIMEOUT
+    if lock_timeout is None:
+        lock_timeout = s.CACHE_LOCK_TIMEOUT
+    if beta is None:
+        beta = s.CACHE_EARLY_REFRESH_BETA
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            prefix = _prefix(key_prefix, generations, request, args, kwargs)
+            lock = _lock_key(request, prefix)
+            response, locked = _cached(
+                request, prefix, lock, lock_timeout, beta
+            )
+            if response is not None:
+                return response
+            if not locked:
+                return view(request, *args, **kwargs)
+            return _rebuild(view, request, args, kwargs, prefix, lock,
+                            timeout, stale_timeout)
+        return wrapper
+    return decorator
+
+
+def anonymous_only(cache_decorator):
+    # Кэширует страницу только для гостей: вошедшим пользователям
+    # показываются кнопки и формы, зависящие от них самих.
+    def decorator(view):
+        cached_view = cache_decorator(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+            return cached_view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def conditional_page(validators):
+    # Условный GET: validators(request, *args, **kwargs) одним дешёвым
+    # запросом возвращает (время последнего изменения, имена поколений)
+    # или None, если страницы нет, и тогда ответ целиком строит view.
+    # Поколения покрывают удаления и правки, не сдвигающие дату: в ETag
+    # входят их значения, а Last-Modified не раньше их последнего сдвига.
+    def state(request, *args, **kwargs):
+        if not hasattr(request, '_conditional_state'):
+            request._conditional_state = validators(
+                request, *args, **kwargs
+            )
+        return request._conditional_state
+
+    def last_modified(request, *args, **kwargs):
+        current = state(request, *args, **kwargs)
+        if current is None:
+            return None
+        modified, names = current
+        bumped = last_bumped(names)
+        bumped = bumped and datetime.fromtimestamp(bumped, timezone.utc)
+        return max(filter(None, (modified, bumped)), default=None)
+
+    def etag(request, *args, **kwargs):
+        current = state(request, *args, **kwargs)
+        if current is None:
+            return None
+        modified, names = current
+        parts = [
+            *get_generations(names),
+            request.user.pk,
+            request.COOKIES.get(s.CSRF_COOKIE_NAME),
+            request.get_full_path(),
+            modified and modified.isoformat(),
+        ]
+        return hashlib.md5(repr(parts).encode()).hexdigest()
+
+    def decorator(view):
+        conditional_view = condition(
+            etag_func=etag, last_modified_func=last_modified
+        )(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            # Без no-cache браузер сам решит, сколько держать страницу
+            # по Last-Modified, и не спросит сервер.
+            patch_cache_control(response, no_cache=True)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,46 @@
+import time
+
+from django.core.cache import cache
+
+GENERATION_KEY = 'generation:{}'
+BUMPED_KEY = 'generation_bumped:{}'
+
+
+def _initial():
+    # Начальное значение берём от времени, а не 1: если ключ поколения
+    # вытеснят из кэша, старые страницы не совпадут с новым поколением.
+    return int(time.time() * 1000)
+
+
+def get_generations(names):
+    keys = [GENERATION_KEY.format(name) for name in names]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            cache.add(key, _initial(), None)
+            values[key] = cache.get(key)
+    return [values[key] for key in keys]
+
+
+def last_bumped(names):
+    # Время последнего сдвига любого из поколений. Если отметку
+    # вытеснили из кэша, считаем, что сдвиг был только что.
+    keys = [BUMPED_KEY.format(name) for name in names]
+    values = cache.get_many(keys)
+    now = time.time()
+    for key in keys:
+        if key not in values:
+            cache.add(key, now, None)
+            values[key] = now
+    return max(values.values(), default=None)
+
+
+def bump(*names):
+    for name in names:
+        key = GENERATION_KEY.format(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial(), None)
+    now = time.time()
+    cache.set_many({BUMPED_KEY.format(name): now for name in names}, None)
@@ -0,0 +1,230 @@
+# Кэш в SQLite, общий для всех процессов на одной машине.
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+MAX_VARIABLES = 500
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    ' key TEXT PRIMARY KEY,'
+    ' value BLOB NOT NULL,'
+    ' expires REAL,'
+    ' accessed REAL NOT NULL'
+    ') WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+)
+
+
+class SQLiteCache(BaseCache):
+    # Записи лежат в одном файле SQLite в режиме WAL: читатели не
+    # блокируют писателя, а все воркеры хоста видят одни и те же ключи.
+    # Для LRU время доступа обновляется не чаще раза в LRU_RESOLUTION
+    # секунд, чтобы чтение горячих ключей не превращалось в запись.
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = os.path.abspath(location)
+        self._busy_timeout = options.get('BUSY_TIMEOUT', 5)
+        self._lru_resolution = options.get('LRU_RESOLUTION', 1)
+        self._local = threading.local()
+
+    @property
+    def _connection(self):
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            connection = sqlite3.connect(
+                self._path,
+                timeout=self._busy_timeout,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                connection.execute(statement)
+            local.connection, local.pid = connection, os.getpid()
+        return local.connection
+
+    @contextmanager
+    def _transaction(self):
+        connection = self._connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _dumps(self, value):
+        return pickle.dumps(value, self.pickle_protocol)
+
+    def _fetch(self, connection, key, now):
+        row = connection.execute(
+            'SELECT value, expires, accessed FROM cache WHERE key = ?',
+            (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[1] is not None and row[1] <= now:
+            connection.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                (key, now)
+            )
+            return None
+        return row
+
+    def _touch_accessed(self, connection, keys, now):
+        connection.executemany(
+            'UPDATE cache SET accessed = ? WHERE key = ? AND accessed < ?',
+            ((now, key, now - self._lru_resolution) for key in keys)
+        )
+
+    def _cull(self, connection, now):
+        if self._max_entries is None:
+            return
+        count = connection.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count < self._max_entries:
+            return
+        connection.execute('DELETE FROM cache WHERE expires <= ?', (now,))
+        count = connection.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count < self._max_entries:
+            return
+        if self._cull_frequency == 0:
+            connection.execute('DELETE FROM cache')
+            return
+        connection.execute(
+            'DELETE FROM cache WHERE key IN ('
+            ' SELECT key FROM cache ORDER BY accessed LIMIT ?'
+            ')',
+            (count // self._cull_frequency,)
+        )
+
+    def _write(self, connection, key, value, timeout, now):
+        connection.execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires, accessed) '
+            'VALUES (?, ?, ?, ?)',
+            (key, self._dumps(value), self.get_backend_timeout(timeout), now)
+        )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._transaction() as connection:
+            if self._fetch(connection, key, now) is not None:
+                return False
+            self._cull(connection, now)
+            self._write(connection, key, value, timeout, now)
+        return True
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        connection = self._connection
+        row = self._fetch(connection, key, now)
+        if row is None:
+            return default
+        if row[2] < now - self._lru_resolution:
+            self._touch_accessed(connection, (key,), now)
+        return pickle.loads(row[0])
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._transaction() as connection:
+            self._cull(connection, now)
+            self._write(connection, key, value, timeout, now)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        with self._transaction() as connection:
+            self._cull(connection, now)
+            for key, value in data.items():
+                self._write(
+                    connection, self._key(key, version), value, timeout, now
+                )
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        cursor = self._connection.execute(
+            'UPDATE cache SET expires = ?, accessed = ? '
+            'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), now, key, now)
+        )
+        return cursor.rowcount > 0
+
+    def delete(self, key, version=None):
+        self._connection.execute(
+            'DELETE FROM cache WHERE key = ?', (self._key(key, version),)
+        )
+
+    def delete_many(self, keys, version=None):
+        self._connection.executemany(
+            'DELETE FROM cache WHERE key = ?',
+            ((self._key(key, version),) for key in keys)
+        )
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        now = time.time()
+        connection = self._connection
+        names = list(keys)
+        rows = []
+        for start in range(0, len(names), MAX_VARIABLES):
+            chunk = names[start:start + MAX_VARIABLES]
+            rows.extend(connection.execute(
+                'SELECT key, value, accessed FROM cache '
+                'WHERE key IN ({}) AND (expires IS NULL OR expires > ?)'
+                .format(', '.join('?' * len(chunk))),
+                (*chunk, now)
+            ))
+        stale = [key for key, _, accessed in rows
+                 if accessed < now - self._lru_resolution]
+        if stale:
+            self._touch_accessed(connection, stale, now)
+        return {keys[key]: pickle.loads(value) for key, value, _ in rows}
+
+    def has_key(self, key, version=None):
+        row = self._connection.execute(
+            'SELECT 1 FROM cache '
+            'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self._key(key, version), time.time())
+        ).fetchone()
+        return row is not None
+
+    def incr(self, key, delta=1, version=None):
+        db_key = self._key(key, version)
+        now = time.time()
+        with self._transaction() as connection:
+            row = self._fetch(connection, db_key, now)
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(row[0]) + delta
+            connection.execute(
+                'UPDATE cache SET value = ?, accessed = ? WHERE key = ?',
+                (self._dumps(value), now, db_key)
+            )
+        return value
+
+    def clear(self):
+        self._connection.execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Соединение живёт весь срок потока, как и у локальных кэшей.
+        pass
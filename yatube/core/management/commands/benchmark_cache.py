@@ -0,0 +1,95 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from core.cache.sqlite import SQLiteCache
+
+BACKENDS = (
+    ('locmem', LocMemCache, 'benchmark'),
+    ('filebased', FileBasedCache, 'filebased'),
+    ('sqlite', SQLiteCache, 'cache.sqlite3'),
+)
+
+
+def read_in_child(backend, location, params, keys, queue):
+    cache = backend(location, params)
+    queue.put(sum(cache.get(key) is not None for key in keys))
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает SQLiteCache с LocMemCache и FileBasedCache: '
+        'скорость операций и доступность записей из другого процесса.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keys', type=int, default=2000)
+        parser.add_argument('--value-size', type=int, default=2048)
+        parser.add_argument('--max-entries', type=int, default=1000)
+
+    def handle(self, *args, keys, value_size, max_entries, **options):
+        names = [f'bench:{i}' for i in range(keys)]
+        value = 'x' * value_size
+        params = {'OPTIONS': {'MAX_ENTRIES': max_entries}}
+        self.stdout.write(
+            f'{"бэкенд":<10}{"set, оп/с":>12}{"get, оп/с":>12}'
+            f'{"get_many, оп/с":>16}{"incr, оп/с":>12}'
+            f'{"видно соседу":>14}'
+        )
+        directory = tempfile.mkdtemp()
+        try:
+            for label, backend, location in BACKENDS:
+                location = os.path.join(directory, location)
+                cache = backend(location, params)
+                cache.clear()
+                row = self.measure(cache, names, value)
+                row.append(self.shared(
+                    backend, location, params, names[-max_entries // 2:]
+                ))
+                self.stdout.write(
+                    f'{label:<10}{row[0]:>12.0f}{row[1]:>12.0f}'
+                    f'{row[2]:>16.0f}{row[3]:>12.0f}{row[4]:>13.0%}'
+                )
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def measure(self, cache, names, value):
+        results = []
+        started = time.perf_counter()
+        for name in names:
+            cache.set(name, value)
+        results.append(len(names) / (time.perf_counter() - started))
+        started = time.perf_counter()
+        for name in names:
+            cache.get(name)
+        results.append(len(names) / (time.perf_counter() - started))
+        started = time.perf_counter()
+        for start in range(0, len(names), 20):
+            cache.get_many(names[start:start + 20])
+        results.append(len(names) / (time.perf_counter() - started))
+        cache.set('bench:counter', 0)
+        started = time.perf_counter()
+        for _ in names:
+            cache.incr('bench:counter')
+        results.append(len(names) / (time.perf_counter() - started))
+        return results
+
+    def shared(self, backend, location, params, names):
+        # Последние записи не должны быть вытеснены; из нового процесса
+        # (spawn, без копии памяти родителя) их видит только общий кэш.
+        context = multiprocessing.get_context('spawn')
+        queue = context.Queue()
+        child = context.Process(
+            target=read_in_child,
+            args=(backend, location, params, names, queue),
+        )
+        child.start()
+        hits = queue.get()
+        child.join()
+        return hits / len(names)
@@ -0,0 +1,41 @@
+from django.db import models
+
+
+class StoredFile(models.Model):
+    # Сколько записей ссылается на файл в HashedStorage: одинаковые
+    # загрузки хранятся одним файлом, и удалять его можно только
+    # вместе с последней ссылкой.
+    name = models.CharField(
+        max_length=255,
+        primary_key=True,
+        verbose_name='Имя файла'
+    )
+    refs = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Ссылок'
+    )
+
+    class Meta:
+        verbose_name = 'Файл'
+        verbose_name_plural = 'Файлы'
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class Checkpoint(models.Model):
+    # Место, где остановилась долгая команда вроде gc_media. В кэше его
+    # могли бы вытеснить, и проход молча начался бы заново.
+    name = models.CharField(
+        max_length=100,
+        primary_key=True,
+        verbose_name='Имя'
+    )
+    position = models.TextField(verbose_name='Позиция')
+
+    class Meta:
+        verbose_name = 'Контрольная точка'
+        verbose_name_plural = 'Контрольные точки'
+
+    def __str__(self) -> str:
+        return self.name
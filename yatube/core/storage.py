@@ -0,0 +1,110 @@
+import os
+import re
+from hashlib import sha256
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+from core.models import StoredFile
+
+SHARD_DEPTH = 2
+SHARD_WIDTH = 2
+
+
+@deconstructible
+class HashedStorage(FileSystemStorage):
+    # Файл называется по sha256 содержимого и раскладывается по вложенным
+    # каталогам: posts/ab/cd/abcd….jpg. Каталог upload_to и расширение
+    # сохраняются, одинаковое содержимое записывается один раз.
+    pattern = re.compile(
+        rf'(?:^|/)(?:[0-9a-f]{{{SHARD_WIDTH}}}/){{{SHARD_DEPTH}}}'
+        r'[0-9a-f]{64}(?:\.\w+)?$'
+    )
+
+    def hashed_name(self, name, content):
+        digest = sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        directory, filename = os.path.split(name)
+        shards = [
+            digest[i * SHARD_WIDTH:(i + 1) * SHARD_WIDTH]
+            for i in range(SHARD_DEPTH)
+        ]
+        extension = os.path.splitext(filename)[1].lower()
+        return os.path.join(directory, *shards, digest + extension)
+
+    def is_hashed(self, name):
+        return bool(name) and bool(self.pattern.search(name))
+
+    def save(self, name, content, max_length=None):
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            # Файл снова нужен: gc_media не трогает файлы моложе
+            # --min-age, а ссылку на него пост заведёт только при коммите.
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length)
+
+
+def acquire(storage, name):
+    # Ссылки считаются одним UPDATE с F-выражением, как счётчики
+    # в posts.stats.
+    if not storage.is_hashed(name):
+        return
+    if StoredFile.objects.filter(name=name).update(refs=F('refs') + 1):
+        return
+    try:
+        with transaction.atomic():
+            StoredFile.objects.create(name=name, refs=1)
+    except IntegrityError:
+        StoredFile.objects.filter(name=name).update(refs=F('refs') + 1)
+
+
+def release(storage, name):
+    # Строка удаляется, когда на файл не осталось ссылок. Сам файл
+    # удаляет gc_media: другой запрос мог только что загрузить то же
+    # содержимое, а его ссылка ещё не видна до коммита.
+    if not storage.is_hashed(name):
+        return
+    StoredFile.objects.filter(name=name, refs__gt=0).update(
+        refs=F('refs') - 1
+    )
+    StoredFile.objects.filter(name=name, refs__lte=0).delete()
+
+
+def walk_files(storage, directory, after=''):
+    # Файлы каталога storage в порядке возрастания имён, начиная после
+    # after. Памяти нужно на один каталог: поддеревья, целиком лежащие
+    # до after, не обходятся вовсе.
+    root = storage.path(directory)
+    if os.path.isdir(root):
+        yield from _walk(root, directory, after)
+
+
+def _walk(path, name, after):
+    # Каталог сравнивается как «имя/»: так порядок обхода совпадает
+    # с порядком полных имён файлов.
+    with os.scandir(path) as scan:
+        entries = sorted(
+            scan,
+            key=lambda entry: (
+                entry.name + '/' * entry.is_dir(follow_symlinks=False)
+            ),
+        )
+    for entry in entries:
+        child = f'{name}/{entry.name}'
+        if entry.is_dir(follow_symlinks=False):
+            prefix = child + '/'
+            if after > prefix and not after.startswith(prefix):
+                continue
+            yield from _walk(entry.path, child, after)
+        elif child > after:
+            yield child, entry
@@ -1,6 +1,24 @@
-from django.test import TestCase, Client
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from django.core.cache import cache as default_cache
+from django.core.files.base import ContentFile
+from django.http import HttpResponse
+from django.test import (
+    TestCase, TransactionTestCase, Client, RequestFactory
+)
 from http import HTTPStatus
 
+from core.cache.decorators import _lock_key, _prefix, cache_page_guarded
+from core.cache.generations import bump
+from core.cache.sqlite import SQLiteCache
+from core.models import StoredFile
+from core.storage import HashedStorage, acquire, release, walk_files
+
 
 class VeiwCustomURL(TestCase):
     def setUp(self):
@@ -10,3 +28,200 @@ class VeiwCustomURL(TestCase):
         response = self.client.get('/nonexisted/')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class SQLiteCacheTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.location, {'OPTIONS': options})
+
+    def test_set_get_delete(self):
+        self.cache.set('key', {'value': 1})
+        self.assertEqual(self.cache.get('key'), {'value': 1})
+        self.assertEqual(self.cache.get_many(['key', 'missing']),
+                         {'key': {'value': 1}})
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_entries_are_shared_between_instances(self):
+        self.cache.set('key', 'общий')
+        self.assertEqual(self.make_cache().get('key'), 'общий')
+
+    def test_timeout_and_add(self):
+        self.cache.set('expired', 1, timeout=-1)
+        self.assertIsNone(self.cache.get('expired'))
+        self.assertTrue(self.cache.add('expired', 2))
+        self.assertFalse(self.cache.add('expired', 3))
+        self.assertEqual(self.cache.get('expired'), 2)
+
+    def test_incr_is_atomic_across_processes(self):
+        self.cache.set('counter', 0)
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=increment, args=(self.location, 50))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get('counter'), 200)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = self.make_cache(
+            MAX_ENTRIES=3, CULL_FREQUENCY=2, LRU_RESOLUTION=0
+        )
+        for key in ('a', 'b', 'c'):
+            cache.set(key, key)
+            time.sleep(0.01)
+        cache.get('a')
+        cache.set('d', 'd')
+        self.assertEqual(set(cache.get_many(['a', 'b', 'c', 'd'])),
+                         {'a', 'c', 'd'})
+
+
+class CachePageGuardedTests(TestCase):
+    def setUp(self):
+        default_cache.clear()
+        self.factory = RequestFactory()
+        self.calls = 0
+
+    def make_view(self, delay=0, timeout=60, **options):
+        @cache_page_guarded(timeout, key_prefix='guarded',
+                            generations=('guarded',), **options)
+        def view(request):
+            self.calls += 1
+            time.sleep(delay)
+            return HttpResponse(f'build {self.calls}')
+        return view
+
+    def test_concurrent_misses_rebuild_once(self):
+        view = self.make_view(delay=0.3)
+        contents = []
+
+        def fetch():
+            contents.append(view(self.factory.get('/guarded/')).content)
+        threads = [threading.Thread(target=fetch) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(set(contents), {b'build 1'})
+
+    def test_stale_page_served_while_other_worker_rebuilds(self):
+        view = self.make_view(timeout=0, stale_timeout=60)
+        request = self.factory.get('/guarded/')
+        view(request)
+        prefix = _prefix('guarded', ('guarded',), request, (), {})
+        default_cache.add(_lock_key(request, prefix), True, 60)
+        self.assertEqual(view(request).content, b'build 1')
+        self.assertEqual(self.calls, 1)
+        default_cache.delete(_lock_key(request, prefix))
+        self.assertEqual(view(request).content, b'build 2')
+
+    def test_early_refresh_with_large_beta(self):
+        view = self.make_view(beta=10 ** 9)
+        request = self.factory.get('/guarded/')
+        view(request)
+        self.assertEqual(view(request).content, b'build 2')
+
+    def test_generation_bump_rebuilds(self):
+        view = self.make_view()
+        request = self.factory.get('/guarded/')
+        view(request)
+        self.assertEqual(view(request).content, b'build 1')
+        bump('guarded')
+        self.assertEqual(view(request).content, b'build 2')
+
+    def test_error_responses_are_not_cached(self):
+        @cache_page_guarded(60, key_prefix='guarded')
+        def view(request):
+            self.calls += 1
+            return HttpResponse(status=HTTPStatus.INTERNAL_SERVER_ERROR)
+        request = self.factory.get('/guarded/')
+        view(request)
+        view(request)
+        self.assertEqual(self.calls, 2)
+
+
+def increment(location, times):
+    cache = SQLiteCache(location, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class HashedStorageTests(TransactionTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.storage = HashedStorage(location=self.directory)
+
+    def test_name_is_sharded_content_hash(self):
+        name = self.storage.save('posts/a.GIF', ContentFile(b'gif'))
+        directory, first, second, filename = name.split('/')
+        self.assertEqual(directory, 'posts')
+        self.assertEqual((first, second), (filename[:2], filename[2:4]))
+        self.assertTrue(filename.endswith('.gif'))
+        self.assertTrue(self.storage.is_hashed(name))
+        self.assertFalse(self.storage.is_hashed('posts/a.gif'))
+
+    def test_duplicates_are_stored_once(self):
+        first = self.storage.save('posts/a.gif', ContentFile(b'same'))
+        second = self.storage.save('posts/b.gif', ContentFile(b'same'))
+        other = self.storage.save('posts/c.gif', ContentFile(b'other'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertEqual(len(os.listdir(os.path.dirname(
+            self.storage.path(first)
+        ))), 1)
+
+    def test_last_reference_leaves_file_to_gc(self):
+        name = self.storage.save('posts/a.gif', ContentFile(b'shared'))
+        acquire(self.storage, name)
+        acquire(self.storage, name)
+        self.assertEqual(StoredFile.objects.get(name=name).refs, 2)
+        release(self.storage, name)
+        self.assertEqual(StoredFile.objects.get(name=name).refs, 1)
+        release(self.storage, name)
+        self.assertFalse(StoredFile.objects.filter(name=name).exists())
+        self.assertTrue(self.storage.exists(name))
+
+    def test_duplicate_save_refreshes_mtime(self):
+        name = self.storage.save('posts/a.gif', ContentFile(b'again'))
+        old = time.time() - 60 * 60 * 48
+        os.utime(self.storage.path(name), (old, old))
+        self.storage.save('posts/b.gif', ContentFile(b'again'))
+        self.assertGreater(
+            os.stat(self.storage.path(name)).st_mtime, old + 60
+        )
+
+    def test_unhashed_names_are_not_counted(self):
+        acquire(self.storage, 'posts/legacy.gif')
+        release(self.storage, '/tmp/legacy.gif')
+        self.assertFalse(StoredFile.objects.exists())
+
+    def test_walk_files_is_ordered_and_resumable(self):
+        for name in ('posts/a/b.gif', 'posts/a.x', 'posts/b/c/d.gif',
+                     'posts/b/e.gif', 'posts/c.gif'):
+            os.makedirs(os.path.dirname(self.storage.path(name)),
+                        exist_ok=True)
+            open(self.storage.path(name), 'wb').close()
+        names = [name for name, _ in walk_files(self.storage, 'posts')]
+        self.assertEqual(names, sorted(names))
+        self.assertEqual(len(names), 5)
+        self.assertEqual(
+            [name for name, _ in walk_files(
+                self.storage, 'posts', 'posts/b/c/d.gif'
+            )],
+            ['posts/b/e.gif', 'posts/c.gif'],
+        )
@@ -5,7 +5,12 @@ import sys
 
 
 def main():
-    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+    # manage.py test берёт настройки для тестов: свой кэш, без фоновых
+    # задач. Остальные команды работают с настройками сайта.
+    settings = 'yatube.settings'
+    if sys.argv[1:2] == ['test']:
+        settings = 'yatube.test_settings'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings)
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
@@ -0,0 +1,121 @@
+from django.db.models import Max
+
+from core.cache.generations import bump
+from posts.groups import get_group_by_id
+from posts.models import Group, Post, User
+from posts.utils import get_detail_post
+
+FEED_GENERATION = 'feed'
+SITE_GENERATION = 'site'
+FOLLOW_GENERATION = 'follow:{}'
+GROUP_TAG = 'group:{}'
+PROFILE_TAG = 'profile:{}'
+POST_TAG = 'post:{}'
+VIEWER_TAG = 'viewer:{}'
+
+
+def invalidate_feeds():
+    bump(FEED_GENERATION)
+
+
+def invalidate_site():
+    # Группы и имена пользователей видны на любой странице.
+    bump(FEED_GENERATION, SITE_GENERATION)
+
+
+def viewer_page(request, *args, **kwargs):
+    # В шапке стоит имя вошедшего пользователя: у каждого своя копия
+    # страницы в кэше, у гостей одна общая.
+    return VIEWER_TAG.format(request.user.pk)
+
+
+def group_page(request, slug):
+    return GROUP_TAG.format(slug)
+
+
+def profile_page(request, username):
+    return PROFILE_TAG.format(username)
+
+
+def post_page(request, post_id):
+    return POST_TAG.format(post_id)
+
+
+def post_page_tags(post, *group_ids):
+    groups = filter(None, map(
+        get_group_by_id, {post.group_id, *group_ids} - {None}
+    ))
+    return (
+        POST_TAG.format(post.pk),
+        PROFILE_TAG.format(post.author.username),
+        *(GROUP_TAG.format(group.slug) for group in groups),
+    )
+
+
+def purge_post_pages(post, *group_ids):
+    bump(*post_page_tags(post, *group_ids))
+
+
+def purge_comment_pages(comment):
+    bump(POST_TAG.format(comment.post_id))
+
+
+def purge_follow_pages(follow):
+    bump(
+        PROFILE_TAG.format(follow.user.username),
+        PROFILE_TAG.format(follow.author.username),
+    )
+
+
+def follow_generation(user_id):
+    return FOLLOW_GENERATION.format(user_id)
+
+
+def user_follow_generation(request, *args, **kwargs):
+    return follow_generation(request.user.pk)
+
+
+def invalidate_follows(*user_ids):
+    bump(*map(follow_generation, user_ids))
+
+
+def index_validators(request):
+    last = Post.objects.aggregate(last=Max('updated'))['last']
+    return last, (FEED_GENERATION,)
+
+
+def group_validators(request, slug):
+    row = Group.objects.filter(slug=slug).annotate(
+        last=Max('posts__updated')
+    ).order_by().values_list('last').first()
+    return row and (row[0], (FEED_GENERATION,))
+
+
+def profile_validators(request, username):
+    # Поколение подписок автора меняется и при подписке на него:
+    # на странице виден счётчик подписчиков и кнопка подписки.
+    row = User.objects.filter(username=username).annotate(
+        last=Max('posts__updated')
+    ).order_by().values_list('pk', 'last').first()
+    return row and (
+        row[1], (FEED_GENERATION, follow_generation(row[0]))
+    )
+
+
+def post_validators(request, post_id):
+    post = get_detail_post(request, post_id)
+    if post is None:
+        return None
+    return (
+        max(post.updated, post.last_comment or post.updated),
+        # Удаление не последнего комментария не сдвигает даты: его
+        # видно только по тегу страницы поста.
+        (FEED_GENERATION, follow_generation(post.author_id),
+         POST_TAG.format(post.pk)),
+    )
+
+
+def follow_validators(request):
+    # Без запроса к базе: любая правка поста сдвигает поколение лент,
+    # подписка и отписка — поколение подписок читателя.
+    return None, (FEED_GENERATION, follow_generation(request.user.pk))
@@ -1,6 +1,9 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
+from posts.groups import GroupChoiceIterator
 from posts.models import Post, Comment
+from posts.uploads import normalize_image
 
 
 class PostForm(forms.ModelForm):
@@ -8,6 +11,17 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['group'].iterator = GroupChoiceIterator
+
+    def clean_image(self):
+        # Уже сохранённая картинка приходит как FieldFile, её не трогаем.
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            return normalize_image(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
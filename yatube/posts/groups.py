@@ -0,0 +1,73 @@
+from django.db import transaction
+from django.forms.models import ModelChoiceIterator
+from django.http import Http404
+
+from core.cache.generations import bump, get_generations
+from posts.models import Group
+
+GROUPS_GENERATION = 'groups'
+
+# Группы хранятся в памяти процесса целиком и перечитываются, когда
+# меняется общее поколение 'groups' в кэше: так правка группы в одном
+# воркере видна всем остальным. Объекты общие для всех потоков,
+# изменять их нельзя.
+_registry = (None, {}, {})
+
+
+def _load():
+    global _registry
+    generation, = get_generations([GROUPS_GENERATION])
+    if _registry[0] != generation:
+        groups = list(Group.objects.order_by('pk'))
+        _registry = (
+            generation,
+            {group.slug: group for group in groups},
+            {group.pk: group for group in groups},
+        )
+    return _registry
+
+
+def invalidate_groups():
+    # Второй сдвиг после коммита: иначе другой воркер может успеть
+    # перечитать группы до фиксации транзакции и запомнить старые.
+    bump(GROUPS_GENERATION)
+    transaction.on_commit(lambda: bump(GROUPS_GENERATION))
+
+
+def all_groups():
+    return list(_load()[2].values())
+
+
+def get_group(slug):
+    return _load()[1].get(slug)
+
+
+def get_group_or_404(slug):
+    group = get_group(slug)
+    if group is None:
+        raise Http404('Группа не найдена')
+    return group
+
+
+def get_group_by_id(pk):
+    return _load()[2].get(pk)
+
+
+def attach_groups(posts):
+    grouped = [post for post in posts if post.group_id is not None]
+    if grouped:
+        by_id = _load()[2]
+        for post in grouped:
+            post.group = by_id.get(post.group_id)
+    return posts
+
+
+class GroupChoiceIterator(ModelChoiceIterator):
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ('', self.field.empty_label)
+        for group in all_groups():
+            yield self.choice(group)
+
+    def __len__(self):
+        return len(all_groups()) + (self.field.empty_label is not None)
@@ -0,0 +1,170 @@
+import time
+from statistics import median
+
+from django.conf import settings as s
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from posts import timeline
+from posts.models import Follow, Post, TimelineEntry, User, UserStats
+from posts.paginators import CursorPaginator
+from posts.stats import reconcile
+from posts.timeline import TimelinePaginator
+
+PREFIX = 'feedbench'
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает ленту подписок в режимах pull, push и hybrid '
+        'на синтетических данных. Все изменения откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=200)
+        parser.add_argument('--authors', type=int, default=50)
+        parser.add_argument('--follows', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=20)
+        parser.add_argument('--pages', type=int, default=5)
+        parser.add_argument('--sample', type=int, default=20)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(**options)
+                raise Rollback
+        except Rollback:
+            pass
+        finally:
+            cache.delete(timeline.PULLED_AUTHORS_KEY)
+
+    def run(self, readers, authors, follows, posts, pages, sample, **kwargs):
+        celebrity, readers = self.populate(readers, authors, follows, posts)
+        sample = readers[:sample]
+        # Порог чуть ниже числа подписчиков знаменитости: в гибриде
+        # подмешивается только она, остальные авторы раскладываются.
+        hybrid_threshold = len(readers) - 1
+        results = []
+        with self.threshold(len(readers)):
+            results.append(
+                ('pull', *self.measure_reads(sample, pages, self.pull))
+                + (0.0, TimelineEntry.objects.count())
+            )
+            self.fill_timelines()
+            results.append(
+                ('push', *self.measure_reads(sample, pages, self.push))
+                + (self.measure_fan_out(celebrity),
+                   TimelineEntry.objects.count())
+            )
+        with self.threshold(hybrid_threshold):
+            TimelineEntry.objects.filter(post__author=celebrity).delete()
+            results.append(
+                ('hybrid', *self.measure_reads(sample, pages, self.hybrid))
+                + (self.measure_fan_out(celebrity),
+                   TimelineEntry.objects.count())
+            )
+        self.report(results, pages)
+
+    def populate(self, readers, authors, follows, posts):
+        User.objects.bulk_create(
+            User(username=f'{PREFIX}_author{i}') for i in range(authors)
+        )
+        User.objects.bulk_create(
+            User(username=f'{PREFIX}_reader{i}') for i in range(readers)
+        )
+        authors = list(User.objects.filter(
+            username__startswith=f'{PREFIX}_author'
+        ).order_by('id'))
+        readers = list(User.objects.filter(
+            username__startswith=f'{PREFIX}_reader'
+        ).order_by('id'))
+        celebrity, authors = authors[0], authors[1:]
+        Follow.objects.bulk_create(
+            Follow(user=reader, author=author)
+            for i, reader in enumerate(readers)
+            for author in [celebrity] + [
+                authors[(i + j) % len(authors)]
+                for j in range(min(follows, len(authors)))
+            ]
+        )
+        Post.objects.bulk_create(
+            Post(author=author, text=f'Публикация {i} {author.username}')
+            for author in [celebrity] + authors
+            for i in range(posts)
+        )
+        reconcile([user.pk for user in [celebrity] + authors + readers])
+        return celebrity, readers
+
+    def threshold(self, value):
+        # Множество pulled хранится в UserStats: размечаем его заново.
+        UserStats.objects.update(pulled_since=None)
+        UserStats.objects.filter(followers__gt=value).update(
+            pulled_since=timezone.now()
+        )
+        cache.delete(timeline.PULLED_AUTHORS_KEY)
+        return override_settings(TIMELINE_FANOUT_MAX_FOLLOWERS=value)
+
+    def fill_timelines(self):
+        for follow in Follow.objects.filter(
+            user__username__startswith=f'{PREFIX}_reader'
+        ).iterator():
+            timeline.backfill(follow)
+
+    def pull(self, reader):
+        return CursorPaginator(
+            Post.objects.feed().filter(author__following__user=reader),
+            s.NUMBER_SHOW,
+        )
+
+    def push(self, reader):
+        return TimelinePaginator(
+            TimelineEntry.objects.filter(user=reader), s.NUMBER_SHOW
+        )
+
+    def hybrid(self, reader):
+        return TimelinePaginator(
+            TimelineEntry.objects.filter(user=reader),
+            s.NUMBER_SHOW,
+            pulled=timeline.pulled_posts(reader),
+        )
+
+    def measure_reads(self, readers, pages, paginator_for):
+        first, deep = [], []
+        for reader in readers:
+            cursor = None
+            for number in range(pages):
+                started = time.perf_counter()
+                page = paginator_for(reader).get_page(before=cursor)
+                elapsed = (time.perf_counter() - started) * 1000
+                (first if number == 0 else deep).append(elapsed)
+                cursor = page.next_cursor
+                if cursor is None:
+                    break
+        return median(first), median(deep) if deep else 0.0
+
+    def measure_fan_out(self, author):
+        started = time.perf_counter()
+        post = Post.objects.create(
+            author=author, text='Новая публикация знаменитости'
+        )
+        elapsed = (time.perf_counter() - started) * 1000
+        post.delete()
+        return elapsed
+
+    def report(self, results, pages):
+        self.stdout.write(
+            f'{"режим":<8}{"стр. 1, мс":>14}{f"стр. 2-{pages}, мс":>16}'
+            f'{"fan-out, мс":>14}{"строк лент":>14}'
+        )
+        for mode, first, deep, fan_out, rows in results:
+            self.stdout.write(
+                f'{mode:<8}{first:>14.2f}{deep:>16.2f}'
+                f'{fan_out:>14.2f}{rows:>14}'
+            )
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+
+
+class Command(BaseCommand):
+    help = (
+        'Возвращает к раскладке по лентам авторов, у которых подписчиков '
+        'стало не больше TIMELINE_FANOUT_DEMOTE_FOLLOWERS. Запускается '
+        'по расписанию.'
+    )
+
+    def handle(self, *args, **options):
+        demoted = 0
+        for stats in timeline.demotable():
+            if timeline.demote(stats):
+                self.stdout.write(f'Автор {stats.user_id} раскладывается')
+                demoted += 1
+        self.stdout.write(self.style.SUCCESS(f'Возвращено авторов: {demoted}'))
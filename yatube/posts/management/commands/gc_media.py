@@ -0,0 +1,240 @@
+import os
+import time
+from itertools import islice
+from types import SimpleNamespace
+
+from django.conf import settings as s
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix, del_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core.models import Checkpoint, StoredFile
+from core.storage import walk_files
+from posts.models import Post
+from posts.resize import parse_variant
+
+CHECKPOINT_KEY = 'gc_media:{}'
+PHASES = {
+    'images': 'картинок',
+    'sources': 'исходников в кэше миниатюр',
+    'thumbnails': 'файлов миниатюр',
+    'resized': 'вариантов /media/r/',
+}
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    batch = list(islice(iterator, size))
+    while batch:
+        yield batch
+        batch = list(islice(iterator, size))
+
+
+def referenced(names):
+    return set(
+        Post.objects.filter(image__in=names).values_list('image', flat=True)
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет картинки постов и миниатюры, на которые ничего не '
+        'ссылается. Работает пачками и продолжает с места остановки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=60 * 60 * 24,
+            help='Не трогать файлы моложе стольких секунд',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать файлы-сироты, ничего не удаляя',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Начать обход заново, забыв контрольные точки',
+        )
+
+    def handle(self, *args, batch_size, min_age, dry_run, restart,
+               **options):
+        self.storage = Post._meta.get_field('image').storage
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        # Свежий файл может принадлежать посту, который ещё не записан.
+        self.deadline = time.time() - min_age
+        if restart:
+            Checkpoint.objects.filter(
+                name__in=[CHECKPOINT_KEY.format(p) for p in PHASES]
+            ).delete()
+        verb = 'Найдено' if dry_run else 'Удалено'
+        for phase, label in PHASES.items():
+            found = getattr(self, f'collect_{phase}')()
+            self.stdout.write(self.style.SUCCESS(
+                f'{verb} {label}: {found}'
+            ))
+
+    def checkpoint(self, phase, default):
+        return Checkpoint.objects.filter(
+            name=CHECKPOINT_KEY.format(phase)
+        ).values_list('position', flat=True).first() or default
+
+    def checkpoints(self, phase, batches):
+        # Контрольная точка сохраняется в базе после каждой пачки и
+        # стирается, когда проход завершён. В режиме dry-run ничего не
+        # запоминается.
+        key = CHECKPOINT_KEY.format(phase)
+        if self.dry_run:
+            yield from (batch for batch, _ in batches)
+            return
+        for batch, last in batches:
+            yield batch
+            Checkpoint.objects.update_or_create(
+                name=key, defaults={'position': last}
+            )
+        Checkpoint.objects.filter(name=key).delete()
+
+    def walk(self, phase, storage, directory):
+        after = self.checkpoint(phase, '')
+        files = walk_files(storage, directory, after)
+        return self.checkpoints(phase, (
+            (batch, batch[-1][0])
+            for batch in batches(files, self.batch_size)
+        ))
+
+    def is_stale(self, entry):
+        return entry.stat(follow_symlinks=False).st_mtime < self.deadline
+
+    def report(self, names):
+        for name in names:
+            self.stdout.write(name)
+        return len(names)
+
+    def collect_images(self):
+        # Оригиналы: разность между обходом каталога и пачкой имён,
+        # на которые ссылаются посты.
+        found = 0
+        upload_to = Post._meta.get_field('image').upload_to.rstrip('/')
+        for batch in self.walk('images', self.storage, upload_to):
+            alive = referenced([name for name, _ in batch])
+            orphans = [
+                name for name, entry in batch
+                if name not in alive and self.is_stale(entry)
+            ]
+            found += self.report(orphans)
+            if not self.dry_run:
+                self.delete_images(orphans)
+        return found
+
+    def delete_images(self, orphans):
+        # Пока шёл обход, картинку могли загрузить заново: save() нашёл
+        # файл на диске и обновил его mtime, а пост ссылается на него
+        # или сошлётся после коммита. Строка такого файла не удаляется,
+        # а сам файл проверяется ещё раз прямо перед удалением.
+        StoredFile.objects.filter(name__in=orphans).exclude(
+            name__in=Post.objects.filter(image__in=orphans).values('image')
+        ).delete()
+        claimed = referenced(orphans) | set(
+            StoredFile.objects.filter(
+                name__in=orphans
+            ).values_list('name', flat=True)
+        )
+        for name in orphans:
+            if name not in claimed and self.still_stale(name):
+                default.kvstore.delete(ImageFile(name))
+                self.storage.delete(name)
+
+    def still_stale(self, name):
+        try:
+            mtime = os.stat(self.storage.path(name)).st_mtime
+        except FileNotFoundError:
+            return False
+        return mtime < self.deadline
+
+    def source_batches(self):
+        prefix = add_prefix('', 'thumbnails')
+        last = self.checkpoint('sources', prefix)
+        while True:
+            keys = list(
+                KVStoreModel.objects.filter(
+                    key__startswith=prefix, key__gt=last
+                ).order_by('key').values_list('key', flat=True)
+                [:self.batch_size]
+            )
+            if not keys:
+                return
+            last = keys[-1]
+            yield [del_prefix(key) for key in keys], last
+
+    def collect_sources(self):
+        # Миниатюры картинок, которых больше нет у постов: sorl хранит
+        # список миниатюр для каждого исходника.
+        found = 0
+        for keys in self.checkpoints('sources', self.source_batches()):
+            sources = dict(KVStoreModel.objects.filter(
+                key__in=[add_prefix(key) for key in keys]
+            ).values_list('key', 'value'))
+            names = {
+                key: deserialize_image_file(sources[add_prefix(key)]).name
+                for key in keys if add_prefix(key) in sources
+            }
+            alive = referenced(list(names.values()))
+            orphans = [key for key in keys if names.get(key) not in alive]
+            found += self.report([names.get(key, key) for key in orphans])
+            if self.dry_run:
+                continue
+            for key in orphans:
+                # kvstore.delete() нужен только ключ исходника.
+                default.kvstore.delete(SimpleNamespace(key=key))
+        return found
+
+    def collect_thumbnails(self):
+        # Файлы в кэше миниатюр, о которых sorl уже ничего не знает.
+        found = 0
+        directory = thumbnail_settings.THUMBNAIL_PREFIX.rstrip('/')
+        for batch in self.walk('thumbnails', default.storage, directory):
+            keys = {
+                name: add_prefix(ImageFile(name, default.storage).key)
+                for name, _ in batch
+            }
+            known = set(KVStoreModel.objects.filter(
+                key__in=keys.values()
+            ).values_list('key', flat=True))
+            orphans = [
+                name for name, entry in batch
+                if keys[name] not in known and self.is_stale(entry)
+            ]
+            found += self.report(orphans)
+            if not self.dry_run:
+                for name in orphans:
+                    default.storage.delete(name)
+        return found
+
+    def collect_resized(self):
+        # Варианты с эндпоинта ресайза: лишние, если картинки больше нет
+        # у постов или размер убран из RESIZE_SIZES.
+        found = 0
+        for batch in self.walk('resized', default_storage,
+                               s.RESIZE_CACHE_DIR):
+            variants = {name: parse_variant(name) for name, _ in batch}
+            alive = referenced([
+                source for _, source in variants.values() if source
+            ])
+            orphans = [
+                name for name, (size, source) in variants.items()
+                if size not in s.RESIZE_SIZES or source not in alive
+            ]
+            found += self.report(orphans)
+            if not self.dry_run:
+                for name in orphans:
+                    default_storage.delete(name)
+        return found
@@ -0,0 +1,83 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.storage import acquire
+from posts import caching
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит картинки постов из плоского каталога в HashedStorage. '
+        'Повторный запуск продолжает с оставшихся файлов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только посчитать файлы для переноса, ничего не меняя',
+        )
+
+    def handle(self, *args, batch_size, dry_run, **options):
+        self.storage = Post._meta.get_field('image').storage
+        self.dry_run = dry_run
+        self.moved = self.missing = 0
+        last_pk = 0
+        while True:
+            # Пачки по первичному ключу: в памяти не больше batch_size
+            # строк, а файлы читаются и пишутся потоком по чанкам.
+            batch = list(
+                Post.objects.filter(pk__gt=last_pk).exclude(image='')
+                .exclude(image=None).order_by('pk')
+                .values_list('pk', 'image')[:batch_size]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1][0]
+            self.migrate(last_pk, [
+                (pk, name) for pk, name in batch
+                if not self.storage.is_hashed(name)
+            ])
+        verb = 'Найдено' if dry_run else 'Перенесено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} картинок: {self.moved}, нет на диске: {self.missing}'
+        ))
+
+    def copy(self, name):
+        if not self.storage.exists(name):
+            self.stdout.write(f'Нет файла {name}')
+            self.missing += 1
+            return None
+        if self.dry_run:
+            return name
+        with self.storage.open(name) as file:
+            return self.storage.save(name, file)
+
+    def migrate(self, last_pk, posts):
+        names = {}
+        for pk, name in posts:
+            if name not in names:
+                names[name] = self.copy(name)
+        if self.dry_run:
+            self.moved += sum(1 for _, name in posts if names[name])
+            return
+        with transaction.atomic():
+            for pk, name in posts:
+                new_name = names[name]
+                # update() не вызывает сигналы: ссылки считаются здесь.
+                if new_name and Post.objects.filter(
+                    pk=pk, image=name
+                ).update(image=new_name):
+                    acquire(self.storage, new_name)
+                    self.moved += 1
+        # Страницы со старыми адресами сбрасываются до удаления файлов.
+        # Посты до last_pk уже перенесены: старый файл может быть нужен
+        # только следующим пачкам.
+        caching.invalidate_site()
+        for name, new_name in names.items():
+            if new_name and not Post.objects.filter(
+                pk__gt=last_pk, image=name
+            ).exists():
+                self.storage.delete(name)
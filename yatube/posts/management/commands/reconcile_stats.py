@@ -0,0 +1,33 @@
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+
+from posts.models import User
+from posts.stats import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает статистику пользователей и исправляет расхождения'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать расхождения, ничего не меняя',
+        )
+
+    def handle(self, *args, batch_size, dry_run, **options):
+        user_ids = User.objects.order_by('pk').values_list(
+            'pk', flat=True
+        ).iterator()
+        fixed = 0
+        batch = list(islice(user_ids, batch_size))
+        while batch:
+            drifted = reconcile(batch, dry_run=dry_run)
+            for pk in drifted:
+                self.stdout.write(f'Расхождение у пользователя {pk}')
+            fixed += len(drifted)
+            batch = list(islice(user_ids, batch_size))
+        verb = 'Найдено' if dry_run else 'Исправлено'
+        self.stdout.write(self.style.SUCCESS(f'{verb} записей: {fixed}'))
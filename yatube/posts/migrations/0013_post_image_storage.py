@@ -0,0 +1,19 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:14
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_comment_post_created_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, help_text='Загрузите картинку', null=True, storage=core.storage.HashedStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+    ]
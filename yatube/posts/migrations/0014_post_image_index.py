@@ -0,0 +1,19 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:18
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_post_image_storage'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, db_index=True, help_text='Загрузите картинку', null=True, storage=core.storage.HashedStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+    ]
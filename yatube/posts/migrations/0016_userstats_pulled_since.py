@@ -0,0 +1,37 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:05
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Now
+
+
+def mark_pulled(apps, schema_editor):
+    # Когда автор перешёл порог, неизвестно: раскладка при уходе
+    # из pulled начнётся с его первой публикации.
+    Post = apps.get_model('posts', 'Post')
+    UserStats = apps.get_model('posts', 'UserStats')
+    first_post = Post.objects.filter(
+        author_id=OuterRef('user_id')
+    ).order_by().values('author_id').annotate(
+        first=Min('pub_date')
+    ).values('first')
+    UserStats.objects.filter(
+        followers__gt=settings.TIMELINE_FANOUT_MAX_FOLLOWERS
+    ).update(pulled_since=Coalesce(Subquery(first_post), Now()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_post_updated_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='pulled_since',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Подмешивается с'),
+        ),
+        migrations.RunPython(mark_pulled, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,27 @@
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from core.storage import HashedStorage
+
 User = get_user_model()
 
 
+class PostQuerySet(models.QuerySet):
+    def feed(self):
+        # Группы подставляются из posts.groups, без JOIN.
+        return self.select_related('author').only(
+            'text',
+            'pub_date',
+            'updated',
+            'image',
+            'author',
+            'author__username',
+            'author__first_name',
+            'author__last_name',
+            'group',
+        )
+
+
 class Post(models.Model):
     text = models.TextField(
         verbose_name='Текст',
@@ -14,6 +32,11 @@ class Post(models.Model):
         db_index=True,
         verbose_name='Дата публикации'
     )
+    updated = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+        verbose_name='Дата изменения'
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -34,11 +57,15 @@ class Post(models.Model):
     image = models.ImageField(
         verbose_name='Картинка',
         upload_to='posts/',
+        storage=HashedStorage(),
+        db_index=True,
         blank=True,
         null=True,
         help_text='Загрузите картинку'
     )
 
+    objects = PostQuerySet.as_manager()
+
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Публикация'
@@ -97,6 +124,12 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ('-created',)
+        indexes = (
+            models.Index(
+                fields=('post', 'created', 'id'),
+                name='comment_post_created_idx'
+            ),
+        )
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
 
@@ -123,8 +156,83 @@ class Follow(models.Model):
         verbose_name_plural = 'Подписки'
         constraints = (
             models.UniqueConstraint(
-                fields=('user', 'author'), name='unique_together')
+                fields=('user', 'author'), name='unique_together'),
         )
 
     def __str__(self) -> str:
         return f'{self.user} подписан(-а) на {self.author}'
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Публикация'
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        ordering = ('-pub_date', '-post_id')
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи лент'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'post'), name='unique_timeline_entry'),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', 'pub_date', 'post'),
+                name='timeline_user_date_idx'),
+        )
+
+    def __str__(self) -> str:
+        return f'{self.post} в ленте {self.user}'
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Публикаций'
+    )
+    followers = models.PositiveIntegerField(
+        default=0,
+        db_index=True,
+        verbose_name='Подписчиков'
+    )
+    following = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписок'
+    )
+    comments = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Комментариев'
+    )
+    # С этого момента публикации автора не раскладываются по лентам,
+    # а подмешиваются при чтении (см. posts.timeline).
+    pulled_since = models.DateTimeField(
+        null=True,
+        blank=True,
+        db_index=True,
+        verbose_name='Подмешивается с'
+    )
+
+    class Meta:
+        verbose_name = 'Статистика пользователя'
+        verbose_name_plural = 'Статистика пользователей'
+
+    def __str__(self) -> str:
+        return f'Статистика {self.user}'
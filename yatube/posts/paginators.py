@@ -0,0 +1,118 @@
+import hashlib
+
+from django.conf import settings as s
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes, force_str
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+CURSOR_SEPARATOR = '|'
+COUNT_KEY = 'paginator_count:{}'
+
+
+def encode_cursor(date, pk):
+    return urlsafe_base64_encode(
+        force_bytes(f'{date.isoformat()}{CURSOR_SEPARATOR}{pk}')
+    )
+
+
+def decode_cursor(cursor):
+    try:
+        date, pk = force_str(urlsafe_base64_decode(cursor)).split(
+            CURSOR_SEPARATOR
+        )
+        date, pk = parse_datetime(date), int(pk)
+    except (TypeError, ValueError):
+        return None
+    if date is None:
+        return None
+    return date, pk
+
+
+def seek(queryset, keys, cursor=None, newer=False, limit=None):
+    # Условие записано как диапазон по первому ключу, чтобы СУБД шла
+    # по индексу, а не сканировала и отбрасывала OFFSET строк.
+    date_key, pk_key = keys
+    if newer:
+        ordering = (date_key, pk_key)
+        bound, skip = 'gte', 'lte'
+    else:
+        ordering = (f'-{date_key}', f'-{pk_key}')
+        bound, skip = 'lte', 'gte'
+    if cursor is not None:
+        date, pk = cursor
+        queryset = queryset.filter(
+            **{f'{date_key}__{bound}': date}
+        ).exclude(
+            **{date_key: date, f'{pk_key}__{skip}': pk}
+        )
+    return list(queryset.order_by(*ordering)[:limit])
+
+
+class CursorPaginator(Paginator):
+    # Страница остаётся обычным Page: номер 1 или 2 и num_pages
+    # описывают лишь наличие соседних страниц относительно курсора,
+    # поэтому шаблоны не требуют COUNT(*) по всей выборке.
+    keys = ('pub_date', 'id')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._has_next = False
+        self._has_previous = False
+
+    @property
+    def num_pages(self):
+        return 1 + self._has_previous + self._has_next
+
+    @property
+    def count(self):
+        # Общее число строк страницам не нужно; если его всё же спросят,
+        # отдаём значение из кэша, которое пересчитывается раз в
+        # PAGINATOR_COUNT_TIMEOUT секунд, а не на каждый запрос.
+        if not hasattr(self.object_list, 'query'):
+            return len(self.object_list)
+        query = str(self.object_list.query).encode()
+        key = COUNT_KEY.format(hashlib.md5(query).hexdigest())
+        return cache.get_or_set(
+            key, self.object_list.count, s.PAGINATOR_COUNT_TIMEOUT
+        )
+
+    def cursor_for(self, item):
+        return encode_cursor(*(getattr(item, key) for key in self.keys))
+
+    def fetch(self, cursor, newer, limit):
+        return seek(self.object_list, self.keys, cursor, newer, limit)
+
+    def get_page(self, before=None, after=None):
+        newer = not before and bool(after)
+        cursor = decode_cursor(after if newer else before) if (
+            before or after
+        ) else None
+        if cursor is None:
+            newer = False
+        rows = self.fetch(cursor, newer, self.per_page + 1)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not newer:
+            return self.cursor_page(rows, has_more, cursor is not None)
+        if not has_more:
+            return self.get_page()
+        rows.reverse()
+        return self.cursor_page(rows, True, True)
+
+    def cursor_page(self, rows, has_next, has_previous):
+        self._has_next = has_next and bool(rows)
+        self._has_previous = has_previous
+        page = self._get_page(rows, 1 + self._has_previous, self)
+        page.next_cursor = (
+            self.cursor_for(rows[-1]) if self._has_next else None
+        )
+        page.previous_cursor = (
+            self.cursor_for(rows[0]) if has_previous and rows else None
+        )
+        return page
+
+
+class CommentPaginator(CursorPaginator):
+    keys = ('created', 'id')
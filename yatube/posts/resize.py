@@ -0,0 +1,122 @@
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings as s
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Варианты лежат в MEDIA_ROOT по тому же пути, что и в URL, так что
+# веб-сервер может отдавать готовые файлы сам, не доходя до Django.
+# Формат сохраняется исходный: расширение в имени должно ему
+# соответствовать.
+SAVE_OPTIONS = {
+    'JPEG': {'quality': 85, 'optimize': True, 'progressive': True},
+    'PNG': {'optimize': True},
+    'WEBP': {'quality': 85, 'method': 4},
+}
+
+BROKEN_KEY = 'resize_broken:{}'
+
+_lock = threading.Lock()
+_building = {}
+
+
+def variant_name(width, height, name):
+    return f'{s.RESIZE_CACHE_DIR}/{width}x{height}/{name}'
+
+
+def parse_variant(name):
+    # Обратное к variant_name(): 'r/480x339/posts/…' ->
+    # ((480, 339), 'posts/…'). Для чужих имён — (None, None).
+    try:
+        _, size, source = name.split('/', 2)
+        width, height = map(int, size.split('x'))
+    except ValueError:
+        return None, None
+    return (width, height), source
+
+
+@contextmanager
+def _thread_lock(path):
+    # Один замок на вариант, пока его кто-то строит.
+    with _lock:
+        lock, users = _building.get(path, (threading.Lock(), 0))
+        _building[path] = (lock, users + 1)
+    try:
+        with lock:
+            yield
+    finally:
+        with _lock:
+            lock, users = _building[path]
+            if users == 1:
+                del _building[path]
+            else:
+                _building[path] = (lock, users - 1)
+
+
+@contextmanager
+def _file_lock(path):
+    # Между процессами: flock на каталоге варианта. Отдельные
+    # .lock-файлы не нужны, а каталоги шардированы и почти не делятся.
+    if fcntl is None:
+        yield
+        return
+    handle = os.open(os.path.dirname(path), os.O_RDONLY)
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(handle)
+
+
+def _render(source, target, size):
+    with Image.open(source) as image:
+        fmt = image.format
+        image.draft('RGB', size)
+        image = ImageOps.exif_transpose(image)
+        image = ImageOps.fit(image, size, Image.LANCZOS)
+        if fmt == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        # Пишем во временный файл рядом и переименовываем: читатели
+        # никогда не видят недописанный вариант.
+        handle, temporary = tempfile.mkstemp(dir=os.path.dirname(target))
+        try:
+            with os.fdopen(handle, 'wb') as file:
+                image.save(file, fmt, **SAVE_OPTIONS.get(fmt, {}))
+            os.replace(temporary, target)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+
+def resized_path(name, width, height):
+    # Путь к готовому варианту на диске. Первый запрос строит его,
+    # одновременные запросы того же варианта (в этом и других
+    # процессах) ждут и получают уже готовый файл. Для исходника,
+    # который Pillow не читает, возвращает None и запоминает это,
+    # чтобы не декодировать файл заново на каждый запрос.
+    target = default_storage.path(variant_name(width, height, name))
+    if os.path.exists(target):
+        return target
+    broken = BROKEN_KEY.format(name)
+    if cache.get(broken):
+        return None
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with _thread_lock(target), _file_lock(target):
+        if not os.path.exists(target):
+            try:
+                _render(default_storage.path(name), target, (width, height))
+            except FileNotFoundError:
+                raise
+            except (OSError, Image.DecompressionBombError):
+                cache.set(broken, True, s.RESIZE_BROKEN_TIMEOUT)
+                return None
+    return target
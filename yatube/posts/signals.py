@@ -0,0 +1,92 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core import storage
+from posts import caching, groups, stats, timeline
+from posts.models import Comment, Follow, Group, Post, User
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, raw=False, **kwargs):
+    # Запоминаем прежние группу и картинку: при переносе поста
+    # сбрасываются страницы обеих групп, а у старой картинки
+    # становится на одну ссылку меньше.
+    instance._previous_group_id = instance._previous_image = None
+    if instance.pk and not raw:
+        instance._previous_group_id, instance._previous_image = (
+            Post.objects.filter(pk=instance.pk).values_list(
+                'group_id', 'image'
+            ).first() or (None, None)
+        )
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    caching.invalidate_feeds()
+    if raw:
+        return
+    caching.purge_post_pages(instance, instance._previous_group_id)
+    if instance.image.name != instance._previous_image:
+        storage.acquire(instance.image.storage, instance.image.name)
+        storage.release(instance.image.storage, instance._previous_image)
+    if created:
+        stats.bump(instance.author_id, posts=1)
+        timeline.fan_out(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    caching.invalidate_feeds()
+    caching.purge_post_pages(instance)
+    stats.bump(instance.author_id, posts=-1)
+    storage.release(instance.image.storage, instance.image.name)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.bump(instance.user_id, following=1)
+        stats.bump(instance.author_id, followers=1)
+        caching.invalidate_follows(instance.user_id, instance.author_id)
+        caching.purge_follow_pages(instance)
+        timeline.promote(instance.author_id)
+        timeline.backfill(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    stats.bump(instance.user_id, following=-1)
+    stats.bump(instance.author_id, followers=-1)
+    caching.invalidate_follows(instance.user_id, instance.author_id)
+    caching.purge_follow_pages(instance)
+    timeline.prune(instance)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.bump(instance.author_id, comments=1)
+        caching.purge_comment_pages(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    stats.bump(instance.author_id, comments=-1)
+    caching.purge_comment_pages(instance)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, **kwargs):
+    groups.invalidate_groups()
+    caching.invalidate_site()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, update_fields=None, **kwargs):
+    # Вход в систему сохраняет только last_login, страницы от него
+    # не зависят.
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    caching.invalidate_site()
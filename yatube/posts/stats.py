@@ -0,0 +1,84 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+from posts.models import Comment, Follow, Post, UserStats
+
+COUNTERS = (
+    ('posts', Post, 'author_id'),
+    ('followers', Follow, 'author_id'),
+    ('following', Follow, 'user_id'),
+    ('comments', Comment, 'author_id'),
+)
+
+
+def recount(user_id):
+    return {
+        field: model.objects.filter(**{key: user_id}).count()
+        for field, model, key in COUNTERS
+    }
+
+
+def _create(user_id):
+    try:
+        with transaction.atomic():
+            return UserStats.objects.create(
+                user_id=user_id, **recount(user_id)
+            )
+    except IntegrityError:
+        return UserStats.objects.get(user_id=user_id)
+
+
+def get_stats(user):
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        return _create(user.pk)
+
+
+def _shifted(field, delta):
+    # Счётчик мог разойтись с данными и уже быть нулём: уменьшение не
+    # уводит его ниже нуля, расхождение исправит reconcile_stats.
+    if delta < 0:
+        return Greatest(F(field) + delta, 0)
+    return F(field) + delta
+
+
+def bump(user_id, **deltas):
+    # Счётчики меняются одним UPDATE с F-выражением, без чтения строки.
+    # Если строки ещё нет, она создаётся пересчётом, который уже учитывает
+    # только что добавленную запись; при удалении отсутствующую строку не
+    # создаём: пользователь может удаляться каскадом.
+    updated = UserStats.objects.filter(user_id=user_id).update(
+        **{field: _shifted(field, delta) for field, delta in deltas.items()}
+    )
+    if not updated and all(delta > 0 for delta in deltas.values()):
+        _create(user_id)
+
+
+def reconcile(user_ids, dry_run=False):
+    counts = {
+        pk: {field: 0 for field, _, _ in COUNTERS} for pk in user_ids
+    }
+    for field, model, key in COUNTERS:
+        rows = model.objects.filter(
+            **{f'{key}__in': user_ids}
+        ).order_by().values(key).annotate(
+            total=Count('id')
+        ).values_list(key, 'total')
+        for pk, total in rows:
+            counts[pk][field] = total
+    existing = UserStats.objects.in_bulk(user_ids)
+    drifted = [
+        pk for pk, values in counts.items()
+        if pk not in existing or any(
+            getattr(existing[pk], field) != value
+            for field, value in values.items()
+        )
+    ]
+    if not dry_run:
+        for pk in drifted:
+            UserStats.objects.update_or_create(
+                user_id=pk, defaults=counts[pk]
+            )
+    return drifted
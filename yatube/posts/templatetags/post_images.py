@@ -0,0 +1,41 @@
+from django import template
+from django.conf import settings as s
+
+from posts.thumbnails import cached_images, schedule
+
+register = template.Library()
+
+MIME_TYPES = {
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+    'WEBP': 'image/webp',
+}
+
+
+def _srcset(variants):
+    return ', '.join(f'{url} {width}w' for url, width in variants)
+
+
+@register.simple_tag
+def post_image(post):
+    # Только готовые варианты (на страницах лент они уже прочитаны
+    # attach_images()): если их нет, генерация ставится в очередь,
+    # а шаблон показывает заглушку. Последний формат из
+    # POST_IMAGE_FORMATS идёт в <img>, остальные — в <source>.
+    if hasattr(post, 'image_variants'):
+        images = post.image_variants
+    else:
+        images = cached_images(post.image.name)
+    if images is None:
+        schedule(post)
+        return None
+    *preferred, fallback = images
+    return {
+        'src': max(images[fallback], key=lambda variant: variant[1])[0],
+        'srcset': _srcset(images[fallback]),
+        'sources': [
+            {'type': MIME_TYPES[fmt], 'srcset': _srcset(images[fmt])}
+            for fmt in preferred
+        ],
+        'sizes': s.POST_IMAGE_SIZES,
+    }
@@ -2,8 +2,9 @@ from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.test import Client, TestCase
 from django.urls import reverse
+from django.utils import timezone
 
-from posts.models import Post
+from posts.models import Comment, Follow, Group, Post
 
 User = get_user_model()
 
@@ -15,14 +16,26 @@ class CacheViewTests(TestCase):
         cls.user = User.objects.create_user(username='cachetester')
         cls.auth_user = Client()
         cls.auth_user.force_login(cls.user)
+        cls.group = Group.objects.create(
+            title='Кэш группа',
+            slug='cache',
+            description='Тестовое описание'
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='КэшТекстТест',
+            group=cls.group
+        )
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
 
     def test_cache_page_index(self):
         response = self.auth_user.get(reverse('posts:index'))
         posts = response.content
-        Post.objects.create(
-            author=self.user,
-            text='КэшТектсТест'
-        )
+        # update() не шлёт сигналов: поколение не меняется, страница из кэша.
+        Post.objects.filter(pk=self.post.pk).update(text='БезСигнала')
         response_again = self.auth_user.get(reverse('posts:index'))
         posts_again = response_again.content
         self.assertEqual(posts, posts_again)
@@ -30,3 +43,187 @@ class CacheViewTests(TestCase):
         response_new = self.auth_user.get(reverse('posts:index'))
         posts_new = response_new.content
         self.assertNotEqual(posts_again, posts_new)
+
+    def test_new_post_invalidates_index(self):
+        self.auth_user.get(reverse('posts:index'))
+        Post.objects.create(author=self.user, text='СвежаяПубликация')
+        response = self.auth_user.get(reverse('posts:index'))
+        self.assertContains(response, 'СвежаяПубликация')
+
+    def test_deleted_post_invalidates_index(self):
+        self.auth_user.get(reverse('posts:index'))
+        Post.objects.get(pk=self.post.pk).delete()
+        response = self.auth_user.get(reverse('posts:index'))
+        self.assertNotContains(response, 'КэшТекстТест')
+
+    def test_group_change_invalidates_index(self):
+        self.auth_user.get(reverse('posts:index'))
+        group = Group.objects.get(pk=self.group.pk)
+        group.slug = 'cache-renamed'
+        group.save()
+        response = self.auth_user.get(reverse('posts:index'))
+        self.assertContains(response, 'cache-renamed')
+
+    def test_login_does_not_invalidate_index(self):
+        response = self.auth_user.get(reverse('posts:index'))
+        Post.objects.filter(pk=self.post.pk).update(text='БезСигнала')
+        Client().force_login(self.user)
+        response_again = self.auth_user.get(reverse('posts:index'))
+        self.assertEqual(response.content, response_again.content)
+
+    def test_index_is_cached_per_user(self):
+        owner = User.objects.create_user(username='alice_secret')
+        client = Client()
+        client.force_login(owner)
+        self.assertContains(client.get(reverse('posts:index')),
+                            'alice_secret')
+        for other in (Client(), self.auth_user):
+            with self.subTest(user=other):
+                response = other.get(reverse('posts:index'))
+                self.assertNotContains(response, 'alice_secret')
+
+    def test_post_card_fragment_is_cached_until_edit(self):
+        group_page = reverse('posts:group_list',
+                             kwargs={'slug': self.group.slug})
+        self.auth_user.get(group_page)
+        Post.objects.filter(pk=self.post.pk).update(text='БезСигнала')
+        self.assertContains(self.auth_user.get(group_page), 'КэшТекстТест')
+        self.auth_user.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.pk}),
+            data={'text': 'Отредактировано', 'group': self.group.pk}
+        )
+        response = self.auth_user.get(group_page)
+        self.assertContains(response, 'Отредактировано')
+        self.assertNotContains(response, 'КэшТекстТест')
+
+
+class FollowFeedCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='cacheauthor')
+        cls.other = User.objects.create_user(username='cacheother')
+        cls.reader = User.objects.create_user(username='cachereader')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post = Post.objects.create(
+            author=cls.author, text='ЛентаПодписок'
+        )
+        Post.objects.create(author=cls.other, text='ЧужаяЛента')
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+        self.url = reverse('posts:follow_index')
+
+    def test_follow_feed_is_cached_per_user(self):
+        self.client.get(self.url)
+        Post.objects.filter(pk=self.post.pk).update(text='БезСигнала')
+        # Только сессия и пользователь: страница берётся из кэша.
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertContains(response, 'ЛентаПодписок')
+        other_reader = Client()
+        other_reader.force_login(self.other)
+        self.assertNotContains(other_reader.get(self.url), 'ЛентаПодписок')
+
+    def test_follow_invalidates_follower_feed(self):
+        self.client.get(self.url)
+        Follow.objects.create(user=self.reader, author=self.other)
+        self.assertContains(self.client.get(self.url), 'ЧужаяЛента')
+
+    def test_unfollow_invalidates_follower_feed(self):
+        self.client.get(self.url)
+        self.client.get(reverse(
+            'posts:profile_unfollow',
+            kwargs={'username': self.author.username}
+        ))
+        self.assertNotContains(self.client.get(self.url), 'ЛентаПодписок')
+
+    def test_new_post_invalidates_follow_feed(self):
+        self.client.get(self.url)
+        Post.objects.create(author=self.author, text='СвежаяВЛенте')
+        self.assertContains(self.client.get(self.url), 'СвежаяВЛенте')
+
+
+class AnonymousPageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='tagauthor')
+        cls.reader = User.objects.create_user(username='tagreader')
+        cls.group = Group.objects.create(
+            title='Старая группа', slug='tag-old', description='Описание'
+        )
+        cls.new_group = Group.objects.create(
+            title='Новая группа', slug='tag-new', description='Описание'
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа', slug='tag-other', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, text='ТегПост', group=cls.group
+        )
+        cls.other_post = Post.objects.create(
+            author=cls.reader, text='ЧужойПост', group=cls.other_group
+        )
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.guest = Client()
+        self.pages = {
+            'detail': reverse('posts:post_detail',
+                              kwargs={'post_id': self.post.pk}),
+            'profile': reverse('posts:profile',
+                               kwargs={'username': self.author.username}),
+            'reader': reverse('posts:profile',
+                              kwargs={'username': self.reader.username}),
+            'group': reverse('posts:group_list',
+                             kwargs={'slug': self.group.slug}),
+            'new_group': reverse('posts:group_list',
+                                 kwargs={'slug': self.new_group.slug}),
+            'other_group': reverse('posts:group_list',
+                                   kwargs={'slug': self.other_group.slug}),
+            'other_detail': reverse('posts:post_detail',
+                                    kwargs={'post_id': self.other_post.pk}),
+        }
+        self.contents = {
+            name: self.guest.get(url).content
+            for name, url in self.pages.items()
+        }
+        # update() не шлёт сигналов: меняется каждая страница, но
+        # несброшенные останутся прежними.
+        Post.objects.update(text='БезСигнала', updated=timezone.now())
+
+    def assertPurged(self, *names):
+        for name, url in self.pages.items():
+            with self.subTest(page=name):
+                content = self.guest.get(url).content
+                self.assertEqual(content != self.contents[name],
+                                 name in names)
+
+    def test_pages_are_cached_for_guests(self):
+        self.assertPurged()
+
+    def test_pages_are_not_cached_for_users(self):
+        client = Client()
+        client.force_login(self.reader)
+        self.assertContains(client.get(self.pages['profile']), 'БезСигнала')
+
+    def test_post_edit_purges_detail_profile_and_both_groups(self):
+        post = Post.objects.get(pk=self.post.pk)
+        post.group = self.new_group
+        post.save()
+        self.assertPurged('detail', 'profile', 'group', 'new_group')
+
+    def test_comment_purges_only_detail(self):
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий'
+        )
+        self.assertPurged('detail')
+
+    def test_follow_purges_only_both_profiles(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertPurged('profile', 'reader')
@@ -0,0 +1,191 @@
+from datetime import timedelta
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from core.cache.generations import BUMPED_KEY
+from posts.caching import FEED_GENERATION, POST_TAG, follow_generation
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='etagtester')
+        cls.reader = User.objects.create_user(username='etagreader')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='etag',
+            description='Тестовое описание'
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Условный запрос',
+            group=cls.group
+        )
+        cls.pages = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': cls.group.slug}),
+            reverse('posts:profile', kwargs={'username': cls.user.username}),
+            reverse('posts:post_detail', kwargs={'post_id': cls.post.pk}),
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.guest = Client()
+        self.auth_user = Client()
+        self.auth_user.force_login(self.reader)
+        cache.clear()
+
+    def revalidate(self, client, url, response):
+        return client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_pages_answer_304_after_one_query(self):
+        for url in self.pages:
+            with self.subTest(url=url):
+                response = self.guest.get(url)
+                self.assertIn('ETag', response)
+                self.assertIn('Last-Modified', response)
+                self.assertIn('no-cache', response['Cache-Control'])
+                with self.assertNumQueries(1):
+                    response = self.revalidate(self.guest, url, response)
+                self.assertEqual(response.status_code,
+                                 HTTPStatus.NOT_MODIFIED)
+
+    def test_if_modified_since_answers_304(self):
+        url = self.pages[0]
+        response = self.guest.get(url)
+        response = self.guest.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_new_post_changes_feeds(self):
+        responses = {url: self.guest.get(url) for url in self.pages[:3]}
+        Post.objects.create(
+            author=self.user, text='Новая', group=self.group
+        )
+        for url, response in responses.items():
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.revalidate(self.guest, url, response).status_code,
+                    HTTPStatus.OK
+                )
+
+    def test_deleted_post_changes_index(self):
+        other = Post.objects.create(author=self.user, text='Старая')
+        Post.objects.filter(pk=other.pk).update(updated=self.post.updated)
+        url = self.pages[0]
+        response = self.guest.get(url)
+        Post.objects.get(pk=other.pk).delete()
+        self.assertEqual(
+            self.revalidate(self.guest, url, response).status_code,
+            HTTPStatus.OK
+        )
+
+    def test_deleted_post_moves_last_modified(self):
+        # Клиент без ETag сравнивает только даты; всё, что было раньше,
+        # сдвигаем на час назад, чтобы удаление попало в другую секунду.
+        hour_ago = timezone.now() - timedelta(hours=1)
+        other = Post.objects.create(author=self.user, text='Старая')
+        Post.objects.update(updated=hour_ago)
+        cache.set(BUMPED_KEY.format(FEED_GENERATION), hour_ago.timestamp())
+        url = self.pages[0]
+        since = self.guest.get(url)['Last-Modified']
+        self.assertEqual(
+            self.guest.get(url, HTTP_IF_MODIFIED_SINCE=since).status_code,
+            HTTPStatus.NOT_MODIFIED
+        )
+        other.delete()
+        self.assertEqual(
+            self.guest.get(url, HTTP_IF_MODIFIED_SINCE=since).status_code,
+            HTTPStatus.OK
+        )
+
+    def test_comment_changes_post_detail(self):
+        url = self.pages[3]
+        response = self.guest.get(url)
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий'
+        )
+        response = self.revalidate(self.guest, url, response)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertContains(response, 'Комментарий')
+
+    def test_deleted_comment_changes_post_pages(self):
+        hour_ago = timezone.now() - timedelta(hours=1)
+        older = Comment.objects.create(
+            post=self.post, author=self.reader, text='Удалённый'
+        )
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Последний'
+        )
+        Comment.objects.update(created=hour_ago)
+        Post.objects.update(updated=hour_ago)
+        cache.set_many({
+            BUMPED_KEY.format(name): hour_ago.timestamp()
+            for name in (FEED_GENERATION, follow_generation(self.user.pk),
+                         POST_TAG.format(self.post.pk))
+        })
+        pages = (
+            self.pages[3],
+            reverse('posts:post_comments', kwargs={'post_id': self.post.pk}),
+        )
+        responses = {url: self.guest.get(url) for url in pages}
+        older.delete()
+        for url, response in responses.items():
+            with self.subTest(url=url):
+                for headers in (
+                    {'HTTP_IF_NONE_MATCH': response['ETag']},
+                    {'HTTP_IF_MODIFIED_SINCE': response['Last-Modified']},
+                ):
+                    fresh = self.guest.get(url, **headers)
+                    self.assertEqual(fresh.status_code, HTTPStatus.OK)
+                    self.assertNotContains(fresh, 'Удалённый')
+
+    def test_follow_changes_profile_and_follow_feed(self):
+        profile = self.pages[2]
+        follow = reverse('posts:follow_index')
+        before = {url: self.auth_user.get(url) for url in (profile, follow)}
+        Follow.objects.create(user=self.reader, author=self.user)
+        for url, response in before.items():
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.revalidate(self.auth_user, url, response)
+                    .status_code,
+                    HTTPStatus.OK
+                )
+
+    def test_follow_feed_revalidates_without_post_queries(self):
+        # Только сессия и пользователь: валидаторы ленты подписок не
+        # читают посты.
+        url = reverse('posts:follow_index')
+        response = self.auth_user.get(url)
+        with self.assertNumQueries(2):
+            response = self.revalidate(self.auth_user, url, response)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_etag_differs_between_users(self):
+        url = self.pages[0]
+        response = self.auth_user.get(url)
+        self.assertEqual(
+            self.revalidate(self.guest, url, response).status_code,
+            HTTPStatus.OK
+        )
+
+    def test_missing_pages_still_404(self):
+        for url in (
+            reverse('posts:group_list', kwargs={'slug': 'missing'}),
+            reverse('posts:profile', kwargs={'username': 'missing'}),
+            reverse('posts:post_detail', kwargs={'post_id': 0}),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.guest.get(url).status_code,
+                                 HTTPStatus.NOT_FOUND)
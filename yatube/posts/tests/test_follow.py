@@ -1,8 +1,13 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
-from posts.models import Post, Follow
+from posts.models import Post, Follow, TimelineEntry
+from posts.timeline import pulled_authors
 
 User = get_user_model()
 
@@ -18,6 +23,7 @@ class FollowViewTests(TestCase):
 
     def setUp(self):
         super().setUp()
+        cache.clear()
         self.post = Post.objects.create(
             author=self.author,
             text='Хороший текст'
@@ -60,3 +66,118 @@ class FollowViewTests(TestCase):
         for key, value in post_context.items():
             with self.subTest(key=key):
                 self.assertEqual(key, value)
+
+    def test_new_post_is_pushed_to_followers(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        new_post = Post.objects.create(
+            author=self.author,
+            text='Публикация для ленты'
+        )
+        entry = TimelineEntry.objects.get(user=self.user, post=new_post)
+        self.assertEqual(entry.pub_date, new_post.pub_date)
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.author).exists()
+        )
+
+    def test_follow_backfills_and_unfollow_prunes_timeline(self):
+        self.auth_user.get(
+            reverse('posts:profile_follow',
+                    kwargs={'username': self.author.username})
+        )
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user, post=self.post).exists())
+        self.auth_user.get(
+            reverse('posts:profile_unfollow',
+                    kwargs={'username': self.author.username})
+        )
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.user).exists()
+        )
+
+    def test_follow_view_hides_unfollowed_authors(self):
+        stranger = User.objects.create_user(username='strangertester')
+        Post.objects.create(author=stranger, text='Чужая публикация')
+        Follow.objects.create(user=self.user, author=self.author)
+        response = self.auth_user.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']), [self.post])
+
+    @override_settings(TIMELINE_FANOUT_MAX_FOLLOWERS=0)
+    def test_popular_author_posts_are_pulled_on_read(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        new_post = Post.objects.create(
+            author=self.author,
+            text='Публикация популярного автора'
+        )
+        self.assertFalse(
+            TimelineEntry.objects.filter(post=new_post).exists()
+        )
+        response = self.auth_user.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), [new_post, self.post]
+        )
+
+    @override_settings(TIMELINE_FANOUT_MAX_FOLLOWERS=1,
+                       TIMELINE_FANOUT_DEMOTE_FOLLOWERS=0)
+    def test_follower_of_pulled_author_gets_older_posts(self):
+        reader = User.objects.create_user(username='secondreader')
+        Follow.objects.create(user=reader, author=self.author)
+        Follow.objects.create(user=self.user, author=self.author)
+        self.assertIn(self.author.pk, pulled_authors())
+        new_post = Post.objects.create(
+            author=self.author,
+            text='Написано, пока автор популярен'
+        )
+        reader_follow = Follow.objects.get(user=reader, author=self.author)
+        reader_follow.delete()
+        reader_follow.pk = None
+        reader_follow.save()
+        self.assertEqual(
+            list(TimelineEntry.objects.filter(
+                user=reader
+            ).values_list('post', flat=True)),
+            [self.post.pk]
+        )
+        self.assertFalse(
+            TimelineEntry.objects.filter(post=new_post).exists()
+        )
+
+    @override_settings(TIMELINE_FANOUT_MAX_FOLLOWERS=2,
+                       TIMELINE_FANOUT_DEMOTE_FOLLOWERS=1)
+    def test_author_is_demoted_only_below_lower_threshold(self):
+        readers = [
+            User.objects.create_user(username=f'reader{number}')
+            for number in range(2)
+        ]
+        Follow.objects.create(user=self.user, author=self.author)
+        for reader in readers:
+            Follow.objects.create(user=reader, author=self.author)
+        new_post = Post.objects.create(
+            author=self.author,
+            text='Написано, пока автор был популярен'
+        )
+        # Отписки на границе не трогают ленты, раскладывает только
+        # команда и только ниже второго порога.
+        Follow.objects.filter(user=readers[0]).delete()
+        call_command('demote_authors', stdout=StringIO())
+        self.assertIn(self.author.pk, pulled_authors())
+        self.assertFalse(
+            TimelineEntry.objects.filter(post=new_post).exists()
+        )
+        Follow.objects.get(user=readers[1]).delete()
+        self.assertFalse(
+            TimelineEntry.objects.filter(post=new_post).exists()
+        )
+        output = StringIO()
+        call_command('demote_authors', stdout=output)
+        self.assertIn('Возвращено авторов: 1', output.getvalue())
+        self.assertNotIn(self.author.pk, pulled_authors())
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(
+                user=self.user
+            ).values_list('post', flat=True)),
+            {self.post.pk, new_post.pk}
+        )
+        response = self.auth_user.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), [new_post, self.post]
+        )
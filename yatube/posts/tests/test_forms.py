@@ -1,13 +1,18 @@
 import shutil
 import tempfile
 from http import HTTPStatus
+from io import BytesIO
 
 from django.contrib.auth import get_user_model
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from django.core.files.base import ContentFile
 from django.core.files.uploadedfile import SimpleUploadedFile
 
 from django.conf import settings
+from PIL import Image
+
+from core.storage import HashedStorage
 from posts.models import Group, Post, Comment
 
 
@@ -75,7 +80,9 @@ class PostFormTests(TestCase):
                 text='Текст публикации в форме',
                 group=self.group.pk,
                 author=self.user,
-                image='posts/small.gif',
+                image=HashedStorage().hashed_name(
+                    'posts/small.gif', ContentFile(SMALL_GIF)
+                ),
             ).exists()
         )
 
@@ -107,6 +114,66 @@ class PostFormTests(TestCase):
         self.assertEqual(group2.pk, form_data['group'])
         self.assertContains(response, form_data['text'], 1, HTTPStatus.OK)
 
+    @staticmethod
+    def photo(name, size):
+        # JPEG с EXIF: ориентация «повернуть на 90°» и модель камеры.
+        image = Image.new('RGB', size, (200, 30, 30))
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x0110] = 'Камера'
+        buffer = BytesIO()
+        image.save(buffer, 'JPEG', exif=exif.tobytes())
+        return SimpleUploadedFile(name, buffer.getvalue(), 'image/jpeg')
+
+    @override_settings(UPLOAD_IMAGE_MAX_SIZE=(40, 40))
+    def test_upload_is_normalized(self):
+        self.auth_user.post(
+            reverse('posts:post_create'),
+            data={'text': 'Фото', 'image': self.photo('photo.jpg', (80, 60))}
+        )
+        post = Post.objects.get(text='Фото')
+        self.assertTrue(post.image.name.startswith('posts/'))
+        self.assertTrue(post.image.name.endswith('.jpg'))
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.format, 'JPEG')
+            # Повёрнуто по EXIF и вписано в 40x40.
+            self.assertEqual(image.size, (30, 40))
+            self.assertEqual(dict(image.getexif()), {})
+
+    @override_settings(UPLOAD_IMAGE_MAX_PIXELS=1000)
+    def test_too_large_upload_is_rejected(self):
+        post_count = Post.objects.count()
+        response = self.auth_user.post(
+            reverse('posts:post_create'),
+            data={'text': 'Бомба', 'image': self.photo('bomb.jpg', (50, 50))}
+        )
+        self.assertEqual(Post.objects.count(), post_count)
+        self.assertFormError(
+            response, 'form', 'image', 'Изображение слишком большое'
+        )
+
+    def test_truncated_upload_is_rejected(self):
+        # Шум плохо сжимается: обрезанный наполовину файл сохраняет
+        # заголовки и проходит проверку ImageField, но не декодируется.
+        buffer = BytesIO()
+        Image.effect_noise((200, 150), 64).convert('RGB').save(
+            buffer, 'JPEG'
+        )
+        content = buffer.getvalue()
+        broken = SimpleUploadedFile(
+            'broken.jpg', content[:len(content) // 2], 'image/jpeg'
+        )
+        post_count = Post.objects.count()
+        response = self.auth_user.post(
+            reverse('posts:post_create'),
+            data={'text': 'Обрезано', 'image': broken}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(Post.objects.count(), post_count)
+        self.assertFormError(
+            response, 'form', 'image', 'Не удалось прочитать изображение'
+        )
+
 
 class CommentFormTests(TestCase):
     @classmethod
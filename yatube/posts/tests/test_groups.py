@@ -0,0 +1,52 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from core.cache.generations import bump
+from posts import groups
+from posts.forms import PostForm
+from posts.groups import (
+    GROUPS_GENERATION, all_groups, get_group, get_group_by_id
+)
+from posts.models import Group
+
+
+class GroupRegistryTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(
+            title='Реестр', slug='registry', description='Описание'
+        )
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        # Откат транзакций между тестами не шлёт сигналов, поэтому
+        # состояние процесса сбрасываем явно.
+        groups._registry = (None, {}, {})
+        all_groups()
+
+    def test_lookups_are_served_from_memory(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(get_group('registry'), self.group)
+            self.assertEqual(get_group_by_id(self.group.pk), self.group)
+            self.assertIsNone(get_group('missing'))
+
+    def test_group_save_reloads_registry(self):
+        group = Group.objects.get(pk=self.group.pk)
+        group.slug = 'registry-renamed'
+        group.save()
+        self.assertIsNone(get_group('registry'))
+        self.assertEqual(get_group('registry-renamed').pk, self.group.pk)
+
+    def test_other_process_change_reloads_registry(self):
+        Group.objects.filter(pk=self.group.pk).update(title='Чужая правка')
+        self.assertEqual(get_group('registry').title, 'Реестр')
+        bump(GROUPS_GENERATION)
+        self.assertEqual(get_group('registry').title, 'Чужая правка')
+
+    def test_post_form_choices_come_from_registry(self):
+        form = PostForm()
+        with self.assertNumQueries(0):
+            choices = list(form.fields['group'].choices)
+        self.assertIn(self.group.title, [label for _, label in choices])
@@ -0,0 +1,348 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+from http import HTTPStatus
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from core.models import Checkpoint, StoredFile
+from posts import resize
+from posts.management.commands import gc_media
+from posts.models import Post
+from posts.thumbnails import cached_thumbnail, generate, variants
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+User = get_user_model()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MediaStorageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='uploader')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def upload(self, name, content=SMALL_GIF):
+        return Post.objects.create(
+            author=self.user,
+            text=name,
+            image=SimpleUploadedFile(name, content, 'image/gif'),
+        )
+
+    def refs(self, name):
+        return StoredFile.objects.get(name=name).refs
+
+    def test_identical_uploads_share_file(self):
+        first = self.upload('first.gif')
+        second = self.upload('second.gif')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(self.refs(first.image.name), 2)
+
+    def test_image_change_moves_reference(self):
+        first = self.upload('first.gif')
+        second = self.upload('second.gif')
+        shared = first.image.name
+        second.image = SimpleUploadedFile('new.gif', b'GIF89a-new')
+        second.save()
+        self.assertEqual(self.refs(shared), 1)
+        self.assertEqual(self.refs(second.image.name), 1)
+        first.delete()
+        self.assertFalse(StoredFile.objects.filter(name=shared).exists())
+
+    def test_migrate_media(self):
+        legacy = FileSystemStorage()
+        old_name = legacy.save('posts/legacy.gif', ContentFile(SMALL_GIF))
+        missing = Post.objects.create(
+            author=self.user, text='Нет файла', image='posts/missing.gif'
+        )
+        posts = [
+            Post.objects.create(author=self.user, text=str(number),
+                                image=old_name)
+            for number in range(3)
+        ]
+        output = StringIO()
+        call_command('migrate_media', batch_size=2, stdout=output)
+        names = {
+            post.image.name
+            for post in Post.objects.filter(pk__in=[p.pk for p in posts])
+        }
+        self.assertEqual(len(names), 1)
+        new_name, = names
+        self.assertTrue(Post.image.field.storage.is_hashed(new_name))
+        self.assertTrue(legacy.exists(new_name))
+        self.assertFalse(legacy.exists(old_name))
+        self.assertEqual(self.refs(new_name), 3)
+        missing.refresh_from_db()
+        self.assertEqual(missing.image.name, 'posts/missing.gif')
+        self.assertIn('Перенесено картинок: 3, нет на диске: 1',
+                      output.getvalue())
+        # Повторный запуск ничего не переносит.
+        call_command('migrate_media', stdout=output)
+        self.assertEqual(self.refs(new_name), 3)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class GcMediaTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='collector')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.storage = Post.image.field.storage
+        self.post = Post.objects.create(
+            author=self.user,
+            text='Живая картинка',
+            image=SimpleUploadedFile('alive.gif', SMALL_GIF, 'image/gif'),
+        )
+        generate(self.post.image.name)
+
+    def age(self, name):
+        old = time.time() - 60 * 60 * 48
+        os.utime(self.storage.path(name), (old, old))
+
+    def orphan(self, name, content):
+        name = FileSystemStorage().save(name, ContentFile(content))
+        self.age(name)
+        return name
+
+    def gc(self, *args):
+        output = StringIO()
+        call_command('gc_media', *args, stdout=output)
+        return output.getvalue()
+
+    def thumbnails(self, name):
+        return [
+            thumbnail
+            for _, geometry, options in variants()
+            for thumbnail in [cached_thumbnail(name, geometry, **options)]
+            if thumbnail is not None and thumbnail.exists()
+        ]
+
+    def test_orphans_are_removed(self):
+        legacy = self.orphan('posts/legacy.gif', b'legacy')
+        hashed = self.storage.save('posts/x.gif', ContentFile(b'hashed'))
+        self.age(hashed)
+        fresh = self.storage.save('posts/y.gif', ContentFile(b'fresh'))
+        stray = self.orphan('cache/ab/cd/stray.jpg', b'stray')
+        output = self.gc('--batch-size=1')
+        for name in (legacy, hashed, stray):
+            self.assertFalse(self.storage.exists(name), name)
+            self.assertIn(name, output)
+        self.assertTrue(self.storage.exists(fresh))
+        self.assertTrue(self.storage.exists(self.post.image.name))
+        self.assertTrue(self.thumbnails(self.post.image.name))
+
+    def test_detached_image_loses_thumbnails(self):
+        name = self.post.image.name
+        thumbnails = self.thumbnails(name)
+        self.assertTrue(thumbnails)
+        self.age(name)
+        Post.objects.filter(pk=self.post.pk).update(image='')
+        self.gc()
+        self.assertFalse(self.storage.exists(name))
+        for thumbnail in thumbnails:
+            self.assertFalse(thumbnail.exists())
+
+    def test_thumbnails_of_missing_source(self):
+        name = self.post.image.name
+        thumbnails = self.thumbnails(name)
+        self.storage.delete(name)
+        Post.objects.filter(pk=self.post.pk).update(image='')
+        self.gc()
+        for thumbnail in thumbnails:
+            self.assertFalse(thumbnail.exists())
+        self.assertFalse(self.thumbnails(name))
+
+    def test_reuploaded_orphan_is_kept(self):
+        name = self.storage.save('posts/x.gif', ContentFile(b'again'))
+        self.age(name)
+        scan = gc_media.referenced
+
+        def reupload(names):
+            # Та же картинка загружается заново сразу после проверки.
+            alive = scan(names)
+            if name in names and not Post.objects.filter(image=name):
+                Post.objects.create(
+                    author=self.user,
+                    text='Снова',
+                    image=SimpleUploadedFile('again.gif', b'again'),
+                )
+            return alive
+
+        with mock.patch.object(gc_media, 'referenced', reupload):
+            self.gc()
+        self.assertTrue(self.storage.exists(name))
+        self.assertEqual(StoredFile.objects.get(name=name).refs, 1)
+
+    def test_deleted_post_image_is_collected(self):
+        post = Post.objects.create(
+            author=self.user,
+            text='Удаляется',
+            image=SimpleUploadedFile('gone.gif', b'gone', 'image/gif'),
+        )
+        name = post.image.name
+        post.delete()
+        self.assertTrue(self.storage.exists(name))
+        self.age(name)
+        self.gc()
+        self.assertFalse(self.storage.exists(name))
+
+    def test_checkpoint_survives_cache_eviction(self):
+        legacy = self.orphan('posts/legacy.gif', b'legacy')
+        Checkpoint.objects.create(
+            name=gc_media.CHECKPOINT_KEY.format('images'),
+            position='posts/zz'
+        )
+        cache.clear()
+        self.gc()
+        self.assertTrue(self.storage.exists(legacy))
+        self.assertFalse(Checkpoint.objects.exists())
+        self.gc()
+        self.assertFalse(self.storage.exists(legacy))
+
+    def test_dry_run_keeps_files(self):
+        legacy = self.orphan('posts/legacy.gif', b'legacy')
+        output = self.gc('--dry-run')
+        self.assertIn(legacy, output)
+        self.assertIn('Найдено картинок: 1', output)
+        self.assertTrue(self.storage.exists(legacy))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, RESIZE_SIZES=((40, 20),))
+class ResizeEndpointTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='resizer')
+        buffer = BytesIO()
+        Image.new('RGB', (100, 60), (10, 200, 10)).save(buffer, 'PNG')
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Большая картинка',
+            image=SimpleUploadedFile('big.png', buffer.getvalue()),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def url(self, width=40, height=20, path=None):
+        return reverse('posts:resized_image', kwargs={
+            'width': width,
+            'height': height,
+            'path': path or self.post.image.name,
+        })
+
+    def get(self, url, **headers):
+        response = Client().get(url, **headers)
+        content = b''.join(getattr(response, 'streaming_content', []))
+        response.close()
+        return response, content
+
+    def test_url_mirrors_disk_cache(self):
+        self.assertEqual(
+            self.url(),
+            f'{settings.MEDIA_URL}'
+            f'{resize.variant_name(40, 20, self.post.image.name)}'
+        )
+
+    def test_variant_is_built_and_cached(self):
+        response, content = self.get(self.url())
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertFalse(response['ETag'].startswith('W/'))
+        with Image.open(BytesIO(content)) as image:
+            self.assertEqual(image.size, (40, 20))
+        path = resize.variant_name(40, 20, self.post.image.name)
+        self.assertTrue(FileSystemStorage().exists(path))
+        again, _ = self.get(self.url())
+        self.assertEqual(again['ETag'], response['ETag'])
+        cached, _ = self.get(self.url(), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_unknown_variants_are_not_found(self):
+        for url in (
+            self.url(width=41),
+            self.url(path='posts/missing.png'),
+            self.url(path='../settings.py'),
+        ):
+            with self.subTest(url=url):
+                response, _ = self.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_unreadable_source_is_not_found(self):
+        post = Post.objects.create(
+            author=self.user,
+            text='Битая картинка',
+            image=SimpleUploadedFile('broken.png', b'not an image'),
+        )
+        url = self.url(path=post.image.name)
+        response, _ = self.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        # Неудача запомнена: файл больше не декодируется.
+        with mock.patch.object(resize, '_render') as render:
+            response, _ = self.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        render.assert_not_called()
+
+    def test_concurrent_requests_build_once(self):
+        # Все потоки получают один и тот же файл: перестроенный вариант
+        # лёг бы через os.replace() с новым inode.
+        barrier = threading.Barrier(8)
+        inodes = []
+
+        def build():
+            barrier.wait()
+            path = resize.resized_path(self.post.image.name, 40, 20)
+            inodes.append(os.stat(path).st_ino)
+
+        threads = [threading.Thread(target=build) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(inodes), 8)
+        self.assertEqual(len(set(inodes)), 1)
+        self.assertFalse(resize._building)
+
+    def test_gc_removes_detached_variants(self):
+        self.get(self.url())
+        path = resize.variant_name(40, 20, self.post.image.name)
+        Post.objects.filter(pk=self.post.pk).update(image='')
+        call_command('gc_media', '--restart', stdout=StringIO())
+        self.assertFalse(FileSystemStorage().exists(path))
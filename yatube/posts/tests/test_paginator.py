@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Group, Post
+from posts.paginators import CursorPaginator
+
+User = get_user_model()
+
+
+class CountFreePaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='counttester')
+        cls.group = Group.objects.create(
+            title='Группа без подсчётов',
+            slug='nocount',
+            description='Тестовое описание'
+        )
+        Post.objects.bulk_create(
+            Post(text=f'Публикация {i}', author=cls.user, group=cls.group)
+            for i in range(int(settings.NUMBER_SHOW) + 3)
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.guest = Client()
+        cache.clear()
+
+    def test_feeds_do_not_count_rows(self):
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+        )
+        for page in pages:
+            with self.subTest(page=page):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.guest.get(page)
+                self.assertTrue(response.context['page_obj'].has_next())
+                for query in queries.captured_queries:
+                    self.assertNotIn('COUNT(', query['sql'].upper())
+
+    def test_count_is_served_from_cache(self):
+        paginator = CursorPaginator(Post.objects.all(), settings.NUMBER_SHOW)
+        total = Post.objects.count()
+        self.assertEqual(paginator.count, total)
+        Post.objects.create(text='Новая публикация', author=self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(paginator.count, total)
+        cache.clear()
+        self.assertEqual(paginator.count, total + 1)
@@ -0,0 +1,102 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.groups import all_groups
+from posts.models import Comment, Follow, Group, Post
+from posts.timeline import pulled_authors
+
+User = get_user_model()
+AUTHORS_COUNT = 5
+
+
+class FeedQueriesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='querytester')
+        cls.group = Group.objects.create(
+            title='Группа запросов',
+            slug='queries',
+            description='Тестовое описание'
+        )
+        cls.authors = []
+        for i in range(AUTHORS_COUNT):
+            author = User.objects.create_user(
+                username=f'queryauthor{i}', first_name=f'Автор {i}'
+            )
+            group = Group.objects.create(
+                title=f'Группа {i}',
+                slug=f'queries{i}',
+                description='Тестовое описание'
+            )
+            Follow.objects.create(user=cls.user, author=author)
+            Post.objects.create(
+                text=f'Публикация {i}',
+                author=author,
+                group=cls.group if i % 2 else group
+            )
+            cls.authors.append(author)
+        cls.auth_user = Client()
+        cls.auth_user.force_login(cls.user)
+
+    def setUp(self):
+        super().setUp()
+        self.guest = Client()
+        cache.clear()
+        # Группы читаются из памяти процесса, загружаем их заранее.
+        all_groups()
+
+    def test_feeds_use_constant_number_of_queries(self):
+        # Первый запрос каждой страницы — агрегат для ETag/Last-Modified.
+        pages = {
+            reverse('posts:index'): 2,
+            reverse(
+                'posts:group_list', kwargs={'slug': self.group.slug}
+            ): 2,
+            reverse(
+                'posts:profile',
+                kwargs={'username': self.authors[0].username}
+            ): 3,
+        }
+        for page, queries in pages.items():
+            with self.subTest(page=page):
+                with self.assertNumQueries(queries):
+                    self.guest.get(page)
+
+    def test_profile_loads_author_counters_and_follow_in_one_query(self):
+        # Сессия, пользователь, агрегат условного GET, автор со
+        # счётчиками и подпиской, страница публикаций.
+        author = self.authors[0]
+        with self.assertNumQueries(5):
+            response = self.auth_user.get(reverse(
+                'posts:profile', kwargs={'username': author.username}
+            ))
+        self.assertTrue(response.context['following'])
+        self.assertEqual(response.context['post_count'], 1)
+        self.assertEqual(response.context['followers'], 1)
+
+    def test_post_detail_uses_two_queries(self):
+        post = Post.objects.filter(author=self.authors[1]).first()
+        for author in self.authors:
+            Comment.objects.create(post=post, author=author, text='Ответ')
+        url = reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        # Пост с автором и счётчиками, страница комментариев с авторами.
+        with self.assertNumQueries(2):
+            response = self.guest.get(url)
+        self.assertEqual(response.context['post_count'], 1)
+        self.assertEqual(response.context['followers'], 1)
+        self.assertEqual(len(response.context['comments']), AUTHORS_COUNT)
+        self.assertContains(response, self.group.slug)
+        with self.assertNumQueries(1):
+            response = self.guest.get(
+                url, HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(response.status_code, 304)
+
+    def test_follow_feed_uses_constant_number_of_queries(self):
+        pulled_authors()
+        with self.assertNumQueries(4):
+            response = self.auth_user.get(reverse('posts:follow_index'))
+        self.assertEqual(len(response.context['page_obj']), AUTHORS_COUNT)
@@ -0,0 +1,75 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Post, UserStats
+from posts.stats import get_stats
+
+User = get_user_model()
+
+
+class UserStatsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='statsauthor')
+        cls.reader = User.objects.create_user(username='statsreader')
+
+    def assertStats(self, user, **expected):
+        stats = UserStats.objects.get(user=user)
+        for field, value in expected.items():
+            with self.subTest(field=field):
+                self.assertEqual(getattr(stats, field), value)
+
+    def test_counters_follow_creates_and_deletes(self):
+        post = Post.objects.create(author=self.author, text='Публикация')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        Comment.objects.create(post=post, author=self.reader, text='Ок')
+        self.assertStats(self.author, posts=1, followers=1)
+        self.assertStats(self.reader, following=1, comments=1)
+        follow.delete()
+        post.delete()
+        self.assertStats(self.author, posts=0, followers=0)
+        self.assertStats(self.reader, following=0, comments=0)
+
+    def test_drifted_counters_do_not_go_negative(self):
+        post = Post.objects.create(author=self.author, text='Публикация')
+        UserStats.objects.filter(user=self.author).update(posts=0)
+        post.delete()
+        self.assertStats(self.author, posts=0)
+
+    def test_views_read_counters_from_stats(self):
+        post = Post.objects.create(author=self.author, text='Публикация')
+        Follow.objects.create(user=self.reader, author=self.author)
+        UserStats.objects.filter(user=self.author).update(
+            posts=7, followers=5
+        )
+        pages = (
+            reverse('posts:profile',
+                    kwargs={'username': self.author.username}),
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}),
+        )
+        for page in pages:
+            with self.subTest(page=page):
+                response = Client().get(page)
+                self.assertEqual(response.context['post_count'], 7)
+                self.assertEqual(response.context['followers'], 5)
+
+    def test_missing_stats_are_recounted(self):
+        Post.objects.create(author=self.author, text='Публикация')
+        UserStats.objects.filter(user=self.author).delete()
+        self.author.refresh_from_db()
+        self.assertEqual(get_stats(self.author).posts, 1)
+
+    def test_reconcile_repairs_drift(self):
+        Post.objects.create(author=self.author, text='Публикация')
+        UserStats.objects.filter(user=self.author).update(posts=42)
+        UserStats.objects.filter(user=self.reader).delete()
+        call_command('reconcile_stats', '--dry-run', stdout=StringIO())
+        self.assertStats(self.author, posts=42)
+        call_command('reconcile_stats', stdout=StringIO())
+        self.assertStats(self.author, posts=1)
+        self.assertStats(self.reader, posts=0, following=0)
@@ -0,0 +1,154 @@
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import skipUnless
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image, features
+
+from posts.caching import invalidate_feeds
+from posts.models import Post
+from posts import thumbnails
+from posts.thumbnails import (
+    attach_images, cached_images, cached_thumbnail, formats, generate,
+    variants
+)
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+User = get_user_model()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='thumbnailer')
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='С картинкой',
+            image=SimpleUploadedFile(
+                name='thumb.gif', content=SMALL_GIF, content_type='image/gif'
+            )
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.guest = Client()
+        self.url = reverse('posts:post_detail',
+                           kwargs={'post_id': self.post.pk})
+
+    def test_lookup_does_not_generate(self):
+        self.assertIsNone(cached_images(self.post.image.name))
+        self.assertIsNone(cached_images(self.post.image.name))
+
+    def test_generated_variants_are_found(self):
+        generate(self.post.image.name)
+        for width, geometry, options in variants():
+            with self.subTest(geometry=geometry, format=options['format']):
+                thumbnail = cached_thumbnail(
+                    self.post.image.name, geometry, **options
+                )
+                self.assertIsNotNone(thumbnail)
+                self.assertTrue(thumbnail.exists())
+                self.assertEqual(thumbnail.width, width)
+
+    def test_variants_cover_widths_and_formats(self):
+        self.assertEqual(
+            len(variants()),
+            len(settings.POST_IMAGE_WIDTHS) * len(formats())
+        )
+        self.assertIn('JPEG', formats())
+
+    def test_card_has_srcset(self):
+        generate(self.post.image.name)
+        content = self.guest.get(self.url).content.decode()
+        for width in settings.POST_IMAGE_WIDTHS:
+            self.assertIn(f' {width}w', content)
+        self.assertIn(f'sizes="{settings.POST_IMAGE_SIZES}"', content)
+
+    @skipUnless(features.check('webp'), 'Pillow собран без WebP')
+    def test_webp_source_comes_first(self):
+        generate(self.post.image.name)
+        content = self.guest.get(self.url).content.decode()
+        self.assertLess(content.index('type="image/webp"'),
+                        content.index('<img class="card-img'))
+
+    @staticmethod
+    def gif(number):
+        # Одинаковые картинки хранятся одним файлом, поэтому каждой
+        # нужно своё содержимое.
+        buffer = BytesIO()
+        Image.new('RGB', (2, 1), (number, 0, 0)).save(buffer, 'GIF')
+        return buffer.getvalue()
+
+    def test_page_images_are_read_in_one_query(self):
+        posts = [self.post] + [
+            Post.objects.create(
+                author=self.user,
+                text=f'Ещё картинка {number}',
+                image=SimpleUploadedFile(
+                    name=f'more{number}.gif', content=self.gif(number),
+                    content_type='image/gif'
+                )
+            )
+            for number in range(3)
+        ]
+        for post in posts[:-1]:
+            generate(post.image.name)
+        cache.clear()
+        # Пустой кэш: все варианты всех постов читаются из kvstore
+        # одним запросом, дальше — только из кэша.
+        with self.assertNumQueries(1):
+            attach_images(posts)
+        with self.assertNumQueries(0):
+            attach_images(posts)
+        for post in posts[:-1]:
+            self.assertEqual(post.image_variants,
+                             cached_images(post.image.name))
+            self.assertIn('JPEG', post.image_variants)
+        self.assertIsNone(posts[-1].image_variants)
+
+    @override_settings(THUMBNAIL_WORKERS=0)
+    def test_synchronous_mode_generates_inline(self):
+        thumbnails._submit(self.post.image.name, ())
+        self.assertIsNotNone(cached_images(self.post.image.name))
+
+    def test_placeholder_until_thumbnail_is_ready(self):
+        response = self.guest.get(self.url)
+        self.assertContains(response, 'Изображение обрабатывается')
+        self.assertNotContains(response, '<img class="card-img')
+        generate(self.post.image.name)
+        cache.clear()
+        response = self.guest.get(self.url)
+        self.assertNotContains(response, 'Изображение обрабатывается')
+        self.assertContains(response, '<img class="card-img')
+
+    def test_card_fragment_picks_up_ready_thumbnail(self):
+        index = reverse('posts:index')
+        self.assertContains(self.guest.get(index),
+                            'Изображение обрабатывается')
+        generate(self.post.image.name)
+        # После генерации воркер сдвигает поколение лент, а карточка
+        # из кэша фрагментов не должна остаться с заглушкой.
+        invalidate_feeds()
+        self.assertContains(self.guest.get(index), '<img class="card-img')
@@ -1,5 +1,6 @@
 import shutil
 import tempfile
+from unittest import mock
 
 from django import forms
 from django.contrib.auth import get_user_model
@@ -9,6 +10,7 @@ from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
 from django.conf import settings
+from posts.groups import all_groups
 from posts.models import Group, Post, Comment
 
 
@@ -252,14 +254,39 @@ class PaginatorViewTest(TestCase):
         )
         for page in pages:
             response_page_1 = self.auth_user.get(page)
-            response_page_2 = self.auth_user.get(page + '?page=2')
-            count_posts_1 = len(response_page_1.context['page_obj'])
-            count_posts_2 = len(response_page_2.context['page_obj'])
-            self.assertEqual(count_posts_1, int(settings.NUMBER_SHOW))
+            page_1 = response_page_1.context['page_obj']
+            response_page_2 = self.auth_user.get(
+                page, {'before': page_1.next_cursor}
+            )
+            page_2 = response_page_2.context['page_obj']
+            self.assertEqual(len(page_1), int(settings.NUMBER_SHOW))
             self.assertEqual(
-                count_posts_2,
+                len(page_2),
                 (POST_COUNT - int(settings.NUMBER_SHOW))
             )
+            self.assertFalse(page_2.has_next())
+            self.assertTrue(page_2.has_previous())
+            self.assertFalse(set(page_1) & set(page_2))
+
+    def test_previous_cursor_returns_first_page(self):
+        page = reverse('posts:index')
+        page_1 = self.auth_user.get(page).context['page_obj']
+        page_2 = self.auth_user.get(
+            page, {'before': page_1.next_cursor}
+        ).context['page_obj']
+        back = self.auth_user.get(
+            page, {'after': page_2.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(back), list(page_1))
+        self.assertFalse(back.has_previous())
+
+    def test_invalid_cursor_returns_first_page(self):
+        response = self.auth_user.get(
+            reverse('posts:index'), {'before': 'не-курсор'}
+        )
+        page_obj = response.context['page_obj']
+        self.assertEqual(len(page_obj), int(settings.NUMBER_SHOW))
+        self.assertFalse(page_obj.has_previous())
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
@@ -315,3 +342,116 @@ class CommentsViewTest(TestCase):
             with self.subTest(key=key):
                 form_field = response.context['form'].fields[key]
                 self.assertIsInstance(form_field, value)
+
+
+@override_settings(COMMENTS_SHOW=5)
+class CommentPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='commentpager')
+        cls.post = Post.objects.create(text='Обсуждаемая', author=cls.user)
+        commentators = [
+            User.objects.create(username=f'commentator{i}')
+            for i in range(12)
+        ]
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=author, text=f'Комментарий {i}')
+            for i, author in enumerate(commentators)
+        )
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.guest = Client()
+        self.url = reverse('posts:post_comments',
+                           kwargs={'post_id': self.post.pk})
+
+    def test_detail_shows_first_comments_only(self):
+        response = self.guest.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        comments = response.context['comments']
+        self.assertEqual(len(comments), 5)
+        self.assertTrue(comments.has_next())
+        self.assertContains(response, f'{self.url}?before=')
+
+    def test_fragment_loads_following_pages(self):
+        seen = []
+        cursor = None
+        while True:
+            # Пост (он же служит условному GET) и комментарии с авторами.
+            with self.assertNumQueries(2):
+                response = self.guest.get(self.url, {'before': cursor}
+                                          if cursor else {})
+            comments = response.context['comments']
+            seen.extend(comment.pk for comment in comments)
+            if not comments.has_next():
+                break
+            cursor = comments.next_cursor
+        self.assertEqual(len(seen), 12)
+        self.assertEqual(len(set(seen)), 12)
+        self.assertTemplateUsed(response, 'posts/includes/comment_list.html')
+        self.assertNotContains(response, 'data-comments-more')
+
+    def test_fragment_for_missing_post(self):
+        response = self.guest.get(
+            reverse('posts:post_comments', kwargs={'post_id': 0})
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(FEED_STREAMING=True)
+class StreamingFeedTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='streamer')
+        cls.group = Group.objects.create(
+            title='Потоковая группа', slug='stream', description='Описание'
+        )
+        Post.objects.bulk_create(
+            Post(text=f'Потоковая публикация {i}', author=cls.user,
+                 group=cls.group)
+            for i in range(POST_COUNT)
+        )
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        all_groups()
+        self.guest = Client()
+
+    def test_feeds_are_streamed(self):
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+        )
+        for page in pages:
+            with self.subTest(page=page):
+                response = self.guest.get(page)
+                self.assertTrue(response.streaming)
+                content = b''.join(response.streaming_content).decode()
+                self.assertEqual(
+                    content.count('Потоковая публикация'),
+                    int(settings.NUMBER_SHOW)
+                )
+                self.assertIn('?before=', content)
+                self.assertTrue(content.rstrip().endswith('</html>'))
+
+    def test_page_cache_is_bypassed(self):
+        # Ни поиска в кэше, ни ожидания чужой пересборки.
+        with mock.patch('core.cache.decorators._cached') as cached:
+            self.test_feeds_are_streamed()
+        cached.assert_not_called()
+
+    def test_head_is_sent_before_page_query(self):
+        response = self.guest.get(reverse('posts:index'))
+        chunks = iter(response.streaming_content)
+        with self.assertNumQueries(0):
+            head = next(chunks).decode()
+        self.assertIn('<title>', head)
+        self.assertNotIn('Потоковая публикация', head)
+        with self.assertNumQueries(1):
+            self.assertIn('Потоковая публикация', next(chunks).decode())
@@ -0,0 +1,206 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings as s
+from django.db import connections, transaction
+from PIL import features
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE, KVStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core.cache.generations import bump
+from posts import caching
+
+logger = logging.getLogger(__name__)
+
+
+class LookupBackend(ThumbnailBackend):
+    # Вычисляет имя миниатюры так же, как get_thumbnail(), но ничего
+    # не генерирует.
+    def thumbnail_name(self, file_, geometry_string, **options):
+        source = ImageFile(file_)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        return self._get_thumbnail_filename(source, geometry_string, options)
+
+
+_backend = LookupBackend()
+_lock = threading.Lock()
+_pending = set()
+_pool = None
+_slots = None
+
+
+def _executor():
+    global _pool, _slots
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=s.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+            _slots = threading.BoundedSemaphore(s.THUMBNAIL_QUEUE_SIZE)
+    return _pool, _slots
+
+
+def formats():
+    # WebP кодируется, только если Pillow собран с libwebp.
+    return [
+        fmt for fmt in s.POST_IMAGE_FORMATS
+        if fmt != 'WEBP' or features.check('webp')
+    ]
+
+
+def variants():
+    # (ширина, геометрия sorl, опции) для каждого формата и ширины;
+    # пропорции у всех вариантов как у POST_IMAGE_SIZE.
+    width, height = s.POST_IMAGE_SIZE
+    return [
+        (variant_width,
+         f'{variant_width}x{round(variant_width * height / width)}',
+         {**s.POST_IMAGE_OPTIONS, 'format': fmt})
+        for fmt in formats()
+        for variant_width in s.POST_IMAGE_WIDTHS
+    ]
+
+
+def _thumbnail(name, geometry, **options):
+    return ImageFile(
+        _backend.thumbnail_name(name, geometry, **options), default.storage
+    )
+
+
+def cached_thumbnail(name, geometry, **options):
+    # Готовая миниатюра из kvstore sorl или None, если её ещё нет.
+    return default.kvstore.get(_thumbnail(name, geometry, **options))
+
+
+def _kvstore_get_many(keys):
+    # kvstore.get() для всех ключей сразу: одно чтение кэша и один
+    # запрос к таблице kvstore на промахи. Промахи кэшируются так же,
+    # как это делает сам sorl.
+    kvstore = default.kvstore
+    if not keys:
+        return {}
+    if not isinstance(kvstore, KVStore):
+        return {key: kvstore._get_raw(key) for key in keys}
+    values = kvstore.cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        found = dict(KVStoreModel.objects.filter(
+            key__in=missing
+        ).values_list('key', 'value'))
+        loaded = {key: found.get(key, EMPTY_VALUE) for key in missing}
+        kvstore.cache.set_many(
+            loaded, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT
+        )
+        values.update(loaded)
+    return {
+        key: None if value == EMPTY_VALUE else value
+        for key, value in values.items()
+    }
+
+
+def images_for(names):
+    # Все варианты картинок: {имя: {формат: [(url, ширина), ...]}}.
+    # None, если хотя бы одного варианта ещё нет: тогда шаблон покажет
+    # заглушку.
+    keys = {
+        name: [
+            (width, options['format'],
+             add_prefix(_thumbnail(name, geometry, **options).key))
+            for width, geometry, options in variants()
+        ]
+        for name in set(filter(None, names))
+    }
+    values = _kvstore_get_many(
+        [key for name_keys in keys.values() for _, _, key in name_keys]
+    )
+    result = {}
+    for name, name_keys in keys.items():
+        if not all(values.get(key) for _, _, key in name_keys):
+            result[name] = None
+            continue
+        images = result[name] = {}
+        for width, fmt, key in name_keys:
+            images.setdefault(fmt, []).append(
+                (deserialize_image_file(values[key]).url, width)
+            )
+    return result
+
+
+def cached_images(name):
+    return images_for([name]).get(name)
+
+
+def attach_images(posts):
+    # Варианты картинок всей страницы читаются разом, шаблон берёт
+    # готовые из post.image_variants.
+    images = images_for(post.image.name for post in posts)
+    for post in posts:
+        post.image_variants = images.get(post.image.name)
+    return posts
+
+
+def generate(name):
+    for _, geometry, options in variants():
+        get_thumbnail(name, geometry, **options)
+
+
+def _run(name, tags):
+    try:
+        generate(name)
+        # Страницы с заглушкой вместо картинки больше не нужны.
+        bump(*tags)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры для %s', name)
+
+
+def _work(name, tags):
+    try:
+        _run(name, tags)
+    finally:
+        connections.close_all()
+        with _lock:
+            _pending.discard(name)
+        _slots.release()
+
+
+def _submit(name, tags):
+    # THUMBNAIL_WORKERS = 0 — синхронный режим для тестов: задача
+    # выполняется сразу и не переживает тест, который её поставил.
+    if not s.THUMBNAIL_WORKERS:
+        _run(name, tags)
+        return
+    pool, slots = _executor()
+    with _lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+    # Очередь ограничена: если она полна, задача отбрасывается, и её
+    # снова поставит первый же показ поста с заглушкой.
+    if not slots.acquire(blocking=False):
+        with _lock:
+            _pending.discard(name)
+        return
+    pool.submit(_work, name, tags)
+
+
+def schedule(post):
+    if not post.image:
+        return
+    tags = (caching.FEED_GENERATION, *caching.post_page_tags(post))
+    name = post.image.name
+    transaction.on_commit(lambda: _submit(name, tags))
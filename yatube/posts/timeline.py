@@ -0,0 +1,181 @@
+import heapq
+from itertools import islice
+from operator import attrgetter
+
+from django.conf import settings as s
+from django.core.cache import cache
+from django.utils import timezone
+
+from posts.models import Follow, Post, TimelineEntry, UserStats
+from posts.paginators import CursorPaginator, seek
+
+PULLED_AUTHORS_KEY = 'timeline_pulled_authors'
+
+
+def _insert(entries):
+    entries = iter(entries)
+    batch = list(islice(entries, s.TIMELINE_BATCH_SIZE))
+    while batch:
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+        batch = list(islice(entries, s.TIMELINE_BATCH_SIZE))
+
+
+def pulled_authors():
+    # Публикации авторов из этого множества не раскладываются по лентам
+    # при записи, а подмешиваются при чтении. Множество общее для записи
+    # и чтения, поэтому решения обеих сторон согласованы.
+    def popular():
+        return frozenset(
+            UserStats.objects.filter(
+                pulled_since__isnull=False
+            ).values_list('user_id', flat=True)
+        )
+    return cache.get_or_set(
+        PULLED_AUTHORS_KEY, popular, s.TIMELINE_PULLED_TIMEOUT
+    )
+
+
+def pulled_posts(user):
+    authors = pulled_authors()
+    if not authors:
+        return None
+    return Post.objects.feed().filter(
+        author_id__in=authors, author__following__user=user
+    )
+
+
+def fan_out(post):
+    if post.author_id in pulled_authors():
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    _insert(
+        TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+        for user_id in followers.iterator()
+    )
+
+
+def backfill(follow):
+    # У популярного автора в ленту кладутся только публикации до
+    # pulled_since: остальные подмешиваются при чтении.
+    posts = Post.objects.filter(author_id=follow.author_id)
+    pulled_since = UserStats.objects.filter(
+        user_id=follow.author_id
+    ).values_list('pulled_since', flat=True).first()
+    if pulled_since:
+        posts = posts.filter(pub_date__lt=pulled_since)
+    _insert(
+        TimelineEntry(user_id=follow.user_id, post_id=pk, pub_date=date)
+        for pk, date in posts.values_list('id', 'pub_date').iterator()
+    )
+
+
+def promote(author_id):
+    # Автор перешёл TIMELINE_FANOUT_MAX_FOLLOWERS: новые публикации
+    # больше не раскладываются.
+    if UserStats.objects.filter(
+        user_id=author_id,
+        followers__gt=s.TIMELINE_FANOUT_MAX_FOLLOWERS,
+        pulled_since=None,
+    ).update(pulled_since=timezone.now()):
+        cache.delete(PULLED_AUTHORS_KEY)
+
+
+def demotable():
+    # Обратно автор возвращается, только опустившись до отдельного,
+    # меньшего порога: иначе каждая отписка и подписка на границе
+    # раскладывала бы его публикации заново.
+    return UserStats.objects.filter(
+        pulled_since__isnull=False,
+        followers__lte=s.TIMELINE_FANOUT_DEMOTE_FOLLOWERS,
+    ).order_by('pk')
+
+
+def _spread(author_id, since):
+    # Публикации автора начиная с since раскладываются по лентам всех
+    # подписчиков. Публикации читаются пачками по первичному ключу.
+    posts = Post.objects.filter(
+        author_id=author_id, pub_date__gte=since
+    ).order_by('pk').values_list('id', 'pub_date')
+    followers = Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True)
+    batch = list(posts[:s.TIMELINE_BATCH_SIZE])
+    while batch:
+        _insert(
+            TimelineEntry(user_id=user_id, post_id=pk, pub_date=date)
+            for user_id in followers.iterator()
+            for pk, date in batch
+        )
+        batch = list(
+            posts.filter(pk__gt=batch[-1][0])[:s.TIMELINE_BATCH_SIZE]
+        )
+
+
+def demote(stats):
+    # Раскладывает публикации, написанные без раскладки, и возвращает
+    # автора к обычной записи. Множество pulled сбрасывается только
+    # после этого, чтобы публикации не пропали из лент ни на мгновение.
+    # Вызывается командой demote_authors, а не из запроса.
+    started = timezone.now()
+    _spread(stats.user_id, stats.pulled_since)
+    if not UserStats.objects.filter(
+        user_id=stats.user_id,
+        pulled_since=stats.pulled_since,
+        followers__lte=s.TIMELINE_FANOUT_DEMOTE_FOLLOWERS,
+    ).update(pulled_since=None):
+        return False
+    cache.delete(PULLED_AUTHORS_KEY)
+    # Публикации, которые fan_out пропустил, пока шла раскладка.
+    _spread(stats.user_id, started)
+    return True
+
+
+def prune(follow):
+    TimelineEntry.objects.filter(
+        user_id=follow.user_id, post__author_id=follow.author_id
+    ).delete()
+
+
+class TimelinePaginator(CursorPaginator):
+    # Лента читается диапазоном по индексу (user, pub_date, post),
+    # а сами публикации добираются одним запросом по первичному ключу.
+    # Публикации популярных авторов (pulled) сливаются с ней при чтении.
+    def __init__(self, object_list, per_page, pulled=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.pulled = pulled
+
+    def fetch(self, cursor, newer, limit):
+        pushed = self.fetch_pushed(cursor, newer, limit)
+        if self.pulled is None:
+            return pushed
+        pulled = seek(self.pulled, self.keys, cursor, newer, limit)
+        merged = heapq.merge(
+            pushed, pulled, key=attrgetter(*self.keys), reverse=not newer
+        )
+        seen = set()
+        posts = []
+        for post in merged:
+            if post.id not in seen:
+                seen.add(post.id)
+                posts.append(post)
+            if len(posts) == limit:
+                break
+        return posts
+
+    def fetch_pushed(self, cursor, newer, limit):
+        entries = seek(
+            self.object_list.only('post_id', 'pub_date'),
+            ('pub_date', 'post_id'),
+            cursor,
+            newer,
+            limit,
+        )
+        posts = Post.objects.feed().in_bulk(
+            [entry.post_id for entry in entries]
+        )
+        return [
+            posts[entry.post_id] for entry in entries
+            if entry.post_id in posts
+        ]
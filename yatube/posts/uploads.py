@@ -0,0 +1,76 @@
+from io import BytesIO
+
+from django.conf import settings as s
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, ImageOps
+
+# Форматы, которые перекодируются при загрузке, и параметры сохранения.
+SAVE_OPTIONS = {
+    'JPEG': {'optimize': True, 'progressive': True},
+    'PNG': {'optimize': True},
+    'WEBP': {'method': 4},
+}
+
+
+TOO_LARGE = ValidationError(
+    'Изображение слишком большое', code='image_too_large'
+)
+BROKEN = ValidationError(
+    'Не удалось прочитать изображение', code='invalid_image'
+)
+
+
+def _open(upload):
+    # Открывается только заголовок: размер известен до распаковки, так
+    # что «бомбы» отсекаются без декодирования.
+    upload.seek(0)
+    try:
+        image = Image.open(upload)
+    except Image.DecompressionBombError:
+        raise TOO_LARGE
+    except OSError:
+        raise BROKEN
+    width, height = image.size
+    if width * height > s.UPLOAD_IMAGE_MAX_PIXELS:
+        raise TOO_LARGE
+    return image
+
+
+def _reencode(image, fmt):
+    orientation = image.getexif().get(0x0112)
+    # thumbnail() сначала вызывает draft() (JPEG декодируется сразу в
+    # уменьшенном масштабе), затем reduce() и только потом ресэмплинг.
+    image.thumbnail(s.UPLOAD_IMAGE_MAX_SIZE, reducing_gap=3.0)
+    if orientation:
+        image = ImageOps.exif_transpose(image)
+    if fmt == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    options = dict(SAVE_OPTIONS[fmt])
+    if fmt in ('JPEG', 'WEBP'):
+        options['quality'] = s.UPLOAD_IMAGE_QUALITY
+    if image.info.get('icc_profile'):
+        options['icc_profile'] = image.info['icc_profile']
+    buffer = BytesIO()
+    image.save(buffer, fmt, **options)
+    return buffer.getvalue()
+
+
+def normalize_image(upload):
+    # Уменьшает картинку до UPLOAD_IMAGE_MAX_SIZE, поворачивает по EXIF
+    # и сохраняет заново без метаданных. Имя и формат файла остаются
+    # прежними. Анимации не трогаются: кадры пришлось бы пересобирать.
+    image = _open(upload)
+    fmt = image.format
+    if fmt not in SAVE_OPTIONS or getattr(image, 'is_animated', False):
+        upload.seek(0)
+        return upload
+    # verify() в ImageField не декодирует пиксели: обрезанный файл
+    # проходит его и ломается только здесь.
+    try:
+        content = _reencode(image, fmt)
+    except Image.DecompressionBombError:
+        raise TOO_LARGE
+    except OSError:
+        raise BROKEN
+    return SimpleUploadedFile(upload.name, content, upload.content_type)
@@ -1,3 +1,4 @@
+from django.conf import settings as s
 from django.urls import path
 
 from posts import views
@@ -11,7 +12,18 @@ urlpatterns = [
     path('create/', views.post_create, name='post_create'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path('posts/<int:post_id>/comment', views.add_comment, name='add_comment'),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments'
+    ),
     path('follow/', views.follow_index, name='follow_index'),
+    path(
+        f'{s.MEDIA_URL.strip("/")}/{s.RESIZE_CACHE_DIR}/'
+        '<int:width>x<int:height>/<path:path>',
+        views.resized_image,
+        name='resized_image'
+    ),
     path(
         'profile/<str:username>/follow',
         views.profile_follow,
@@ -0,0 +1,92 @@
+from functools import wraps
+from uuid import uuid4
+
+from django.conf import settings as s
+from django.http import StreamingHttpResponse
+from django.shortcuts import render
+from django.template.loader import render_to_string
+from django.db.models import BooleanField, Exists, OuterRef, Subquery, Value
+
+from posts import thumbnails
+from posts.groups import attach_groups
+from posts.models import Comment, Follow, Post
+from posts.paginators import CursorPaginator
+
+
+def paginate(request, object_list, paginator_class=CursorPaginator,
+             **kwargs):
+    paginator = paginator_class(object_list, s.NUMBER_SHOW, **kwargs)
+    page = paginator.get_page(
+        before=request.GET.get('before'),
+        after=request.GET.get('after'),
+    )
+    attach_groups(page)
+    thumbnails.attach_images(page)
+    return page
+
+
+def is_following(user, author='pk'):
+    # Подзапрос для annotate(): подписан ли user на автора строки.
+    if not user.is_authenticated:
+        return Value(False, output_field=BooleanField())
+    return Exists(Follow.objects.filter(user=user, author=OuterRef(author)))
+
+
+def get_detail_post(request, post_id):
+    # Пост с автором, его счётчиками и датой последнего комментария.
+    # Запоминается в request: условный GET и сама view читают его
+    # одним запросом.
+    if not hasattr(request, '_detail_post'):
+        last_comment = Comment.objects.filter(
+            post=OuterRef('pk')
+        ).order_by('-created').values('created')[:1]
+        post = Post.objects.select_related('author__stats').annotate(
+            last_comment=Subquery(last_comment)
+        ).filter(pk=post_id).first()
+        request._detail_post = post and attach_groups([post])[0]
+    return request._detail_post
+
+
+def feed_cache(cache_decorator):
+    # Кэш страниц для лент. Потоковый ответ всё равно не кэшируется, а
+    # ожидание чужой пересборки задержало бы отправку шапки, поэтому при
+    # FEED_STREAMING кэш пропускается целиком.
+    def decorator(view):
+        cached_view = cache_decorator(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if s.FEED_STREAMING:
+                return view(request, *args, **kwargs)
+            return cached_view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def render_feed(request, template, context, get_page):
+    # get_page() строит страницу ленты. В потоковом режиме (FEED_STREAMING)
+    # шаблон рендерится без неё: вместо списка карточек и пагинатора в
+    # нём стоят метки. Шапка уходит клиенту сразу, а страница читается
+    # из базы и карточки отрисовываются по одной уже во время отправки.
+    if not s.FEED_STREAMING:
+        return render(request, template, {**context, 'page_obj': get_page()})
+    marker = uuid4().hex
+    head, middle, tail = render_to_string(
+        template, {**context, 'stream_marker': marker}, request
+    ).split(f'<!--{marker}-->')
+
+    def stream():
+        yield head
+        page_obj = get_page()
+        for number, post in enumerate(page_obj):
+            if number:
+                yield '<hr>'
+            yield render_to_string(
+                'posts/includes/post_card.html', {'post': post}, request
+            )
+        yield middle
+        yield render_to_string(
+            'posts/includes/paginator.html', {'page_obj': page_obj}, request
+        )
+        yield tail
+    return StreamingHttpResponse(stream())
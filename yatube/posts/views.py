@@ -1,84 +1,136 @@
+import os
+from functools import partial
+
+from django.http import FileResponse, Http404
 from django.shortcuts import get_object_or_404, render, redirect
-from django.views.decorators.cache import cache_page
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
 from django.conf import settings as s
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
 
-from posts.models import Group, Post, Follow, User
+from core.cache.decorators import (
+    anonymous_only, cache_page_guarded, conditional_page
+)
+from posts import caching, resize, thumbnails
+from posts.models import Post, Follow, TimelineEntry, User
 from posts.forms import PostForm, CommentForm
+from posts.groups import get_group_or_404
+from posts.paginators import CommentPaginator
+from posts.stats import get_stats
+from posts.timeline import TimelinePaginator, pulled_posts
+from posts.utils import (
+    feed_cache, get_detail_post, is_following, paginate, render_feed
+)
 
 
-@cache_page(s.TIME_CACHE, key_prefix='index_page')
+@conditional_page(caching.index_validators)
+@feed_cache(cache_page_guarded(
+    s.TIME_CACHE, key_prefix='index_page',
+    generations=(caching.FEED_GENERATION, caching.viewer_page)
+))
 def index(request):
     template = 'posts/index.html'
     title = 'Последние обновления на сайте'
     description = 'Добро пожаловать на главную страницу Yatube'
-    posts_lists = Post.objects.all()
-    paginator = Paginator(posts_lists, s.NUMBER_SHOW)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts_lists = Post.objects.feed()
     context = {
-        'page_obj': page_obj,
         'title': title,
         'description': description
     }
-    return render(request, template, context)
+    return render_feed(
+        request, template, context, partial(paginate, request, posts_lists)
+    )
 
 
+@conditional_page(caching.group_validators)
+@feed_cache(anonymous_only(cache_page_guarded(
+    s.TIME_CACHE, key_prefix='group_page',
+    generations=(caching.SITE_GENERATION, caching.group_page)
+)))
 def group_posts(request, slug):
     template = 'posts/group_list.html'
-    group = get_object_or_404(Group, slug=slug)
-    posts_lists = group.posts.all()
-    paginator = Paginator(posts_lists, s.NUMBER_SHOW)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    group = get_group_or_404(slug)
+    posts_lists = group.posts.feed()
     context = {
-        'page_obj': page_obj,
         'group': group,
     }
-    return render(request, template, context)
+    return render_feed(
+        request, template, context, partial(paginate, request, posts_lists)
+    )
 
 
+@conditional_page(caching.profile_validators)
+@feed_cache(anonymous_only(cache_page_guarded(
+    s.TIME_CACHE, key_prefix='profile_page',
+    generations=(caching.SITE_GENERATION, caching.profile_page)
+)))
 def profile(request, username):
     template = 'posts/profile.html'
-    author = get_object_or_404(User, username=username)
-    posts_lists = author.posts.select_related('author')
-    post_count = posts_lists.count()
-    paginator = Paginator(posts_lists, s.NUMBER_SHOW)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    title = f'Профиль пользователя {username}'
-    following = (
-        request.user.is_authenticated
-        and author.following.filter(user=request.user).exists()
+    author = get_object_or_404(
+        User.objects.select_related('stats').annotate(
+            is_following=is_following(request.user)
+        ),
+        username=username
     )
-    followers = Follow.objects.filter(author=author).count()
+    posts_lists = author.posts.feed()
+    author_stats = get_stats(author)
+    title = f'Профиль пользователя {username}'
+    following = author.is_following
     context = {
-        'post_count': post_count,
+        'post_count': author_stats.posts,
         'author': author,
         'title': title,
-        'page_obj': page_obj,
         'following': following,
-        'followers': followers
+        'followers': author_stats.followers
     }
-    return render(request, template, context)
+    return render_feed(
+        request, template, context, partial(paginate, request, posts_lists)
+    )
 
 
+@conditional_page(caching.post_validators)
+@anonymous_only(cache_page_guarded(
+    s.POST_PAGE_CACHE, key_prefix='post_page',
+    generations=(caching.SITE_GENERATION, caching.post_page)
+))
 def post_detail(request, post_id):
     template = 'posts/post_detail.html'
-    post = get_object_or_404(Post, id=post_id)
-    post_count = post.author.posts.count()
-    followers = post.author.following.count()
+    post = get_detail_post(request, post_id)
+    if post is None:
+        raise Http404('Публикация не найдена')
+    author_stats = get_stats(post.author)
     title = f'Публикация {post}'
-    comments = post.comments.all()
+    comments = CommentPaginator(
+        post.comments.select_related('author'), s.COMMENTS_SHOW
+    ).get_page()
     form = CommentForm(request.POST or None)
     context = {
         'title': title,
         'post': post,
-        'post_count': post_count,
+        'post_count': author_stats.posts,
         'form': form,
         'comments': comments,
-        'followers': followers
+        'followers': author_stats.followers
+    }
+    return render(request, template, context)
+
+
+@conditional_page(caching.post_validators)
+@anonymous_only(cache_page_guarded(
+    s.POST_PAGE_CACHE, key_prefix='comments_page',
+    generations=(caching.SITE_GENERATION, caching.post_page)
+))
+def post_comments(request, post_id):
+    template = 'posts/includes/comment_list.html'
+    post = get_detail_post(request, post_id)
+    if post is None:
+        raise Http404('Публикация не найдена')
+    comments = CommentPaginator(
+        post.comments.select_related('author'), s.COMMENTS_SHOW
+    ).get_page(before=request.GET.get('before'))
+    context = {
+        'post': post,
+        'comments': comments,
     }
     return render(request, template, context)
 
@@ -99,6 +151,7 @@ def post_create(request):
         post = form.save(False)
         post.author = request.user
         post.save()
+        thumbnails.schedule(post)
         return redirect('posts:profile', username=post.author)
     context = {'form': form, 'title': title}
     return render(request, template, context)
@@ -122,6 +175,8 @@ def post_edit(request, post_id):
     )
     if form.is_valid():
         form.save()
+        if 'image' in form.changed_data:
+            thumbnails.schedule(post)
         return redirect('posts:post_detail', post_id)
     context = {'form': form, 'title': title, 'is_edit': True}
     return render(request, template, context)
@@ -140,20 +195,27 @@ def add_comment(request, post_id):
 
 
 @login_required
+@conditional_page(caching.follow_validators)
+@feed_cache(cache_page_guarded(
+    s.TIME_CACHE, key_prefix='follow_page',
+    generations=(caching.FEED_GENERATION, caching.user_follow_generation)
+))
 def follow_index(request):
     template = 'posts/follow.html'
     title = 'Избранные авторы'
     description = 'На странице отображаются авторы на которых вы подписаны'
-    posts = Post.objects.filter(author__following__user=request.user).all()
-    paginator = Paginator(posts, s.NUMBER_SHOW)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    get_page = partial(
+        paginate,
+        request,
+        TimelineEntry.objects.filter(user=request.user),
+        TimelinePaginator,
+        pulled=pulled_posts(request.user),
+    )
     context = {
         'title': title,
         'description': description,
-        'page_obj': page_obj
     }
-    return render(request, template, context)
+    return render_feed(request, template, context, get_page)
 
 
 @login_required
@@ -171,3 +233,28 @@ def profile_unfollow(request, username):
     follower = get_object_or_404(Follow, author=following, user=request.user)
     follower.delete()
     return redirect('posts:profile', username=username)
+
+
+def resized_image(request, width, height, path):
+    if ((width, height) not in s.RESIZE_SIZES
+            or not Post.objects.filter(image=path).exists()):
+        raise Http404('Изображение не найдено')
+    try:
+        target = resize.resized_path(path, width, height)
+    except FileNotFoundError:
+        target = None
+    if target is None:
+        raise Http404('Изображение не найдено')
+    # Файл варианта не меняется, пока его не перестроят: mtime и размер
+    # дают сильный ETag, как у nginx.
+    stat = os.stat(target)
+    etag = quote_etag(f'{stat.st_mtime_ns:x}-{stat.st_size:x}')
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(stat.st_mtime)
+    )
+    if response is None:
+        response = FileResponse(open(target, 'rb'))
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    patch_cache_control(response, public=True, max_age=s.RESIZE_MAX_AGE)
+    return response
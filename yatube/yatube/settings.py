@@ -148,12 +148,55 @@ LOGIN_REDIRECT_URL = 'posts:index'
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 NUMBER_SHOW = '10'
-TIME_CACHE = 20
+COMMENTS_SHOW = 20
+# Отдавать ленты потоком: шапка сразу, карточки по мере отрисовки.
+# Кэш страниц лент при этом не используется.
+FEED_STREAMING = False
+# Миниатюры создаются в фоне после сохранения поста; до этого шаблоны
+# показывают заглушку. Каждая картинка нарезается на POST_IMAGE_WIDTHS
+# в пропорциях POST_IMAGE_SIZE во всех форматах POST_IMAGE_FORMATS.
+POST_IMAGE_SIZE = (960, 339)
+POST_IMAGE_WIDTHS = (480, 768, 960)
+POST_IMAGE_FORMATS = ('WEBP', 'JPEG')
+POST_IMAGE_OPTIONS = {'crop': 'center', 'upscale': True}
+POST_IMAGE_SIZES = '(max-width: 960px) 100vw, 960px'
+# Загруженные картинки уменьшаются до UPLOAD_IMAGE_MAX_SIZE и сохраняются
+# без EXIF. Больше UPLOAD_IMAGE_MAX_PIXELS не принимаются вовсе.
+UPLOAD_IMAGE_MAX_SIZE = (1920, 1920)
+UPLOAD_IMAGE_MAX_PIXELS = 40_000_000
+UPLOAD_IMAGE_QUALITY = 85
+# /media/r/<ширина>x<высота>/<картинка поста> строит вариант по запросу
+# и кладёт его в MEDIA_ROOT/r; разрешены только размеры из RESIZE_SIZES.
+RESIZE_CACHE_DIR = 'r'
+RESIZE_SIZES = ((480, 170), (768, 271), (960, 339), (150, 150))
+RESIZE_MAX_AGE = 60 * 60 * 24 * 30
+# Сколько помнить, что исходник не читается, и сразу отвечать 404.
+RESIZE_BROKEN_TIMEOUT = 60 * 60
+THUMBNAIL_WORKERS = 2
+THUMBNAIL_QUEUE_SIZE = 64
+TIME_CACHE = 60 * 60
+# Счётчики автора на странице поста не сбрасывают её кэш.
+POST_PAGE_CACHE = 60 * 5
+CACHE_STALE_TIMEOUT = 60
+CACHE_LOCK_TIMEOUT = 10
+CACHE_LOCK_POLL = 0.05
+CACHE_EARLY_REFRESH_BETA = 1.0
+PAGINATOR_COUNT_TIMEOUT = 60 * 5
+TIMELINE_BATCH_SIZE = 500
+TIMELINE_FANOUT_MAX_FOLLOWERS = 10000
+# Порог возврата к раскладке (команда demote_authors), заметно ниже
+# TIMELINE_FANOUT_MAX_FOLLOWERS.
+TIMELINE_FANOUT_DEMOTE_FOLLOWERS = 8000
+TIMELINE_PULLED_TIMEOUT = 60 * 5
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.sqlite.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
     }
 }
 
@@ -0,0 +1,22 @@
+# Настройки для тестов (pytest.ini, manage.py test). Кэш тот же
+# SQLiteCache, что и у сайта, но в отдельном временном каталоге, а
+# миниатюры создаются сразу: фоновая задача пережила бы тест и писала
+# бы в уже удалённый MEDIA_ROOT.
+import atexit
+import os
+import shutil
+import tempfile
+
+from yatube.settings import *  # noqa: F401,F403
+from yatube.settings import CACHES
+
+_cache_dir = tempfile.mkdtemp(prefix='yatube-cache-')
+atexit.register(shutil.rmtree, _cache_dir, ignore_errors=True)
+
+CACHES = {
+    'default': {
+        **CACHES['default'],
+        'LOCATION': os.path.join(_cache_dir, 'cache.sqlite3'),
+    }
+}
+THUMBNAIL_WORKERS = 0